@@ -0,0 +1,96 @@
+"""
+Query latency of the OMS hot queries as the collections grow, with and without the index registry.
+Runs against a scratch database so the app's data is never touched.
+
+    python -m benchmarks.index_benchmark --sizes 10000 100000 1000000
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from database.indexes import INDEX_REGISTRY
+from database.mongo_db_connection import client
+
+BENCHMARK_DB_NAME = "oms_benchmark"
+STATUSES = ["Pending", "Processing", "Shipped", "Delivered"]
+BATCH_SIZE = 10_000
+# The collections build_documents can fill; other registry collections (e.g. the outbox) are not benchmarked
+BENCHMARK_COLLECTIONS = ("users", "products", "orders")
+
+
+def build_documents(collection_name: str, start: int, stop: int):
+    base_date = datetime(2025, 1, 1)
+    for i in range(start, stop):
+        if collection_name == "users":
+            yield {"user_id": f"u{i}", "email": f"user{i}@example.com", "full_name": f"User {i}",
+                   "role": {"is_admin": False}, "cart": [], "orders": [{"order_id": i, "total_price": 10}]}
+        elif collection_name == "products":
+            yield {"product_id": f"p{i}", "name": f"Product {i}", "price": i % 500 + 1, "stock": 100}
+        elif collection_name == "orders":
+            yield {"order_id": i, "user_id": f"u{i}", "status": STATUSES[i % len(STATUSES)],
+                   "items": [{"product_id": f"p{i}", "quantity": 1}], "total_price": 10,
+                   "created_at": base_date + timedelta(minutes=i), "updated_at": base_date + timedelta(minutes=i)}
+
+
+def grow(db, size: int) -> None:
+    for collection_name in BENCHMARK_COLLECTIONS:
+        collection = db[collection_name]
+        current = collection.estimated_document_count()
+        batch = []
+        for document in build_documents(collection_name, current, size):
+            batch.append(document)
+            if len(batch) == BATCH_SIZE:
+                collection.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            collection.insert_many(batch, ordered=False)
+
+
+def hot_queries(size: int):
+    target = size // 2
+    middle = datetime(2025, 1, 1) + timedelta(minutes=target)
+    return {
+        "users.email": ("users", {"email": f"user{target}@example.com"}),
+        "users.user_id": ("users", {"user_id": f"u{target}"}),
+        "users.orders.order_id": ("users", {"orders.order_id": target}),
+        "products.product_id": ("products", {"product_id": f"p{target}"}),
+        "orders.order_id": ("orders", {"order_id": target}),
+        "orders.status+created_at": ("orders", {"status": "Pending",
+                                                "created_at": {"$gte": middle, "$lte": middle + timedelta(days=1)}}),
+    }
+
+
+def time_query(collection, query: dict, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(collection.find(query).limit(100))
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def run(sizes, repeat: int) -> None:
+    client.drop_database(BENCHMARK_DB_NAME)
+    db = client[BENCHMARK_DB_NAME]
+    print(f"{'size':>10} {'query':<26} {'no index (ms)':>14} {'indexed (ms)':>13}")
+    for size in sorted(sizes):
+        grow(db, size)
+        for collection_name in BENCHMARK_COLLECTIONS:
+            db[collection_name].drop_indexes()
+        queries = hot_queries(size)
+        without = {name: time_query(db[coll], query, repeat) for name, (coll, query) in queries.items()}
+        for collection_name in BENCHMARK_COLLECTIONS:
+            db[collection_name].create_indexes(INDEX_REGISTRY[collection_name])
+        for name, (coll, query) in queries.items():
+            indexed = time_query(db[coll], query, repeat)
+            print(f"{size:>10} {name:<26} {without[name]:>14.2f} {indexed:>13.2f}")
+    client.drop_database(BENCHMARK_DB_NAME)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark OMS hot queries with and without indexes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
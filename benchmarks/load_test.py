@@ -0,0 +1,285 @@
+"""
+Load generator for a running OMS server: weighted customer and admin journeys over httpx/asyncio.
+
+Closed loop (a fixed number of virtual users, each starting the next journey when the last one ends):
+
+    python -m benchmarks.load_test --concurrency 50 --duration 60 --output load.json
+
+Open loop (journeys start at a target arrival rate, whether or not earlier ones have finished):
+
+    python -m benchmarks.load_test --rate 200 --duration 60 --weights browse=70,cart=15,checkout=10,admin=5
+
+Reports throughput and p50/p95/p99 latency per endpoint; --output writes the same report as JSON
+(with the git commit) so runs can be compared across commits. The demo users share two carts, so for
+realistic cart and checkout traffic load synthetic users first (python -m benchmarks.synthetic_data)
+and pass --synthetic-users.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from utils.constants import card_payload
+
+DEFAULT_BASE_URL = "http://127.0.0.1:8000"
+DEFAULT_WEIGHTS = {"browse": 60, "cart": 20, "checkout": 15, "admin": 5}
+# Demo accounts seeded on startup; synthetic users log in as user<i>@example.com (see benchmarks.synthetic_data)
+DEMO_CUSTOMERS = [("john.doe@example.com", "John1"), ("jane.smith@example.com", "Jane2")]
+DEMO_ADMINS = [("alice.johnson@example.com", "Admin1")]
+SYNTHETIC_PASSWORD = "Passw0rd"
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))]
+
+
+class Recorder:
+    """Latency samples and status codes per endpoint ("METHOD /route/{template}")."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.journeys = Counter()
+        self.dropped = 0  # Open loop arrivals skipped because max_in_flight was reached
+
+    def record(self, endpoint: str, milliseconds: float, status) -> None:
+        self.latencies[endpoint].append(milliseconds)
+        self.statuses[endpoint][str(status)] += 1
+
+    def report(self, elapsed: float) -> dict:
+        def summarize(latencies: List[float], statuses: Counter) -> dict:
+            latencies = sorted(latencies)
+            errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500)
+            return {
+                "requests": len(latencies),
+                "throughput_rps": round(len(latencies) / elapsed, 2),
+                "errors": errors,
+                "statuses": dict(statuses),
+                "latency_ms": {
+                    "p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+                    "p99": percentile(latencies, 99), "max": latencies[-1] if latencies else None,
+                },
+            }
+
+        endpoints = {endpoint: summarize(self.latencies[endpoint], self.statuses[endpoint])
+                     for endpoint in sorted(self.latencies)}
+        total_statuses = sum(self.statuses.values(), Counter())
+        return {
+            "duration_seconds": round(elapsed, 2),
+            "total": summarize([ms for samples in self.latencies.values() for ms in samples], total_statuses),
+            "endpoints": endpoints,
+            "journeys": dict(self.journeys),
+            "dropped_arrivals": self.dropped,
+        }
+
+
+class Session:
+    """One logged-in account; every request goes through request() so it is timed and recorded."""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, token: str, rng: random.Random,
+                 products: List[dict]):
+        self.client = client
+        self.recorder = recorder
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.rng = rng
+        self.products = products
+
+    async def request(self, method: str, route: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(f"{method} {route}", (time.perf_counter() - started) * 1000, type(e).__name__)
+            return None
+        self.recorder.record(f"{method} {route}", (time.perf_counter() - started) * 1000, response.status_code)
+        return response
+
+    def cart_lines(self) -> List[dict]:
+        products = self.rng.sample(self.products, min(len(self.products), self.rng.randint(1, 3)))
+        return [{"product_id": product["product_id"], "name": product["name"], "quantity": self.rng.randint(1, 3)}
+                for product in products]
+
+
+async def browse(session: Session) -> None:
+    await session.request("GET", "/products", "/products")
+    for product in session.rng.sample(session.products, min(len(session.products), 2)):
+        await session.request("GET", "/product/{product_id}", f"/product/{product['product_id']}")
+
+
+async def cart_churn(session: Session) -> None:
+    await session.request("PUT", "/cart", "/cart", json=session.cart_lines())
+    await session.request("GET", "/cart", "/cart")
+    await session.request("DELETE", "/cart", "/cart")
+
+
+async def checkout(session: Session) -> None:
+    await session.request("DELETE", "/cart", "/cart")
+    await session.request("PUT", "/cart", "/cart", json=session.cart_lines())
+    await session.request("POST", "/checkout", "/checkout", json=card_payload)
+    await session.request("GET", "/orders", "/orders", params={"limit": 20})
+
+
+async def admin_status_update(session: Session) -> None:
+    response = await session.request("GET", "/panel/orders/status/{status}", "/panel/orders/status/pending",
+                                     params={"limit": 50})
+    orders = response.json().get("orders", []) if response is not None and response.status_code == 200 else []
+    if orders:
+        order = session.rng.choice(orders)
+        await session.request("PUT", "/panel/orders/update-status", "/panel/orders/update-status",
+                              json={"order_id": order["order_id"], "new_status": "Processing"})
+
+
+# name -> (journey, role of the account that runs it)
+SCENARIOS = {
+    "browse": (browse, "customer"),
+    "cart": (cart_churn, "customer"),
+    "checkout": (checkout, "customer"),
+    "admin": (admin_status_update, "admin"),
+}
+
+
+async def login(client: httpx.AsyncClient, accounts) -> List[str]:
+    async def login_one(email: str, password: str) -> str:
+        response = await client.post("/login", json={"email": email, "password": password})
+        response.raise_for_status()
+        return response.json()["token"]
+
+    return await asyncio.gather(*(login_one(email, password) for email, password in accounts))
+
+
+def parse_weights(text: str) -> Dict[str, int]:
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}. Valid: {', '.join(SCENARIOS)}")
+        weights[name] = int(weight)
+    return weights
+
+
+class LoadTest:
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, weights: Dict[str, int] = None, duration: float = 30,
+                 concurrency: int = 20, rate: Optional[float] = None, max_in_flight: int = 1000,
+                 synthetic_users: int = 0, seed: int = 1):
+        self.base_url = base_url
+        self.weights = weights or DEFAULT_WEIGHTS
+        self.duration = duration
+        self.concurrency = concurrency
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.synthetic_users = synthetic_users
+        self.rng = random.Random(seed)
+        self.recorder = Recorder()
+        self.tokens: Dict[str, List[str]] = {}
+        self.products: List[dict] = []
+
+    def _pick(self):
+        names = list(self.weights)
+        name = self.rng.choices(names, [self.weights[name] for name in names])[0]
+        return name, SCENARIOS[name]
+
+    async def _run_one(self, client: httpx.AsyncClient) -> None:
+        name, (journey, role) = self._pick()
+        session = Session(client, self.recorder, self.rng.choice(self.tokens[role]),
+                          random.Random(self.rng.random()), self.products)
+        self.recorder.journeys[name] += 1
+        await journey(session)
+
+    async def _closed_loop(self, client: httpx.AsyncClient, deadline: float) -> None:
+        async def virtual_user():
+            while time.perf_counter() < deadline:
+                await self._run_one(client)
+
+        await asyncio.gather(*(virtual_user() for _ in range(self.concurrency)))
+
+    async def _open_loop(self, client: httpx.AsyncClient, deadline: float) -> None:
+        in_flight = set()
+        while time.perf_counter() < deadline:
+            if len(in_flight) < self.max_in_flight:
+                task = asyncio.create_task(self._run_one(client))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            else:
+                self.recorder.dropped += 1
+            await asyncio.sleep(self.rng.expovariate(self.rate))  # Poisson arrivals
+        await asyncio.gather(*in_flight)
+
+    async def run(self) -> dict:
+        connections = self.max_in_flight if self.rate else self.concurrency
+        limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=30) as client:
+            customers = [(f"user{i}@example.com", SYNTHETIC_PASSWORD) for i in range(self.synthetic_users)]
+            self.tokens = {"customer": await login(client, customers or DEMO_CUSTOMERS),
+                           "admin": await login(client, DEMO_ADMINS)}
+            response = await client.get("/products", headers={"Authorization": f"Bearer {self.tokens['customer'][0]}"})
+            response.raise_for_status()
+            self.products = response.json()["products"]
+
+            started = time.perf_counter()
+            deadline = started + self.duration
+            if self.rate:
+                await self._open_loop(client, deadline)
+            else:
+                await self._closed_loop(client, deadline)
+            elapsed = time.perf_counter() - started
+
+        return {"meta": self.meta(), **self.recorder.report(elapsed)}
+
+    def meta(self) -> dict:
+        try:
+            commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+        except OSError:
+            commit = None
+        return {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": commit or None,
+            "base_url": self.base_url,
+            "mode": "open" if self.rate else "closed",
+            "concurrency": None if self.rate else self.concurrency,
+            "rate": self.rate,
+            "weights": self.weights,
+        }
+
+
+def print_report(report: dict) -> None:
+    print(f"{'endpoint':<40} {'reqs':>7} {'rps':>8} {'err':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+    for endpoint, stats in rows:
+        latency = stats["latency_ms"]
+        print(f"{endpoint:<40} {stats['requests']:>7} {stats['throughput_rps']:>8.1f} {stats['errors']:>5} "
+              f"{latency['p50'] or 0:>8.1f} {latency['p95'] or 0:>8.1f} {latency['p99'] or 0:>8.1f}")
+    if report["dropped_arrivals"]:
+        print(f"Dropped arrivals (max in flight reached): {report['dropped_arrivals']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive weighted OMS user journeys against a running server")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds")
+    parser.add_argument("--concurrency", type=int, default=20, help="Virtual users (closed loop)")
+    parser.add_argument("--rate", type=float, default=None, help="Journeys started per second (open loop)")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Open loop cap on concurrent journeys")
+    parser.add_argument("--weights", type=parse_weights, default=DEFAULT_WEIGHTS,
+                        help="e.g. browse=60,cart=20,checkout=15,admin=5")
+    parser.add_argument("--synthetic-users", type=int, default=0, help="Log in as the first N synthetic users")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+    load_test = LoadTest(args.base_url, args.weights, args.duration, args.concurrency, args.rate,
+                         args.max_in_flight, args.synthetic_users, args.seed)
+    result = asyncio.run(load_test.run())
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
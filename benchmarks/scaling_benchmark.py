@@ -0,0 +1,262 @@
+"""
+How every OMS endpoint degrades as the data grows. For each size the scratch database is reseeded with
+synthetic data (benchmarks.synthetic_data), the app's lifespan is started (indexes, notification
+dispatcher) and each endpoint is called in-process through the ASGI app and measured: median latency and
+MongoDB commands issued per request (cache version polls excluded). Every size runs in a fresh process,
+so the peak RSS reported for it is that size's own.
+
+    python -m benchmarks.scaling_benchmark --sizes 1000 100000 1000000 --save-baseline baseline.json
+    python -m benchmarks.scaling_benchmark --sizes 1000 100000 --baseline baseline.json --threshold 0.25
+
+With --baseline the run exits with status 1 when an endpoint got slower than the baseline by more
+than the threshold (and the noise floor), or issues more MongoDB commands than it used to.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+from pymongo import monitoring
+
+BENCHMARK_DB_NAME = "oms_scaling_benchmark"
+
+
+# Cache version stamps are polled at most once per interval, so whether a poll lands inside a
+# measured call depends on timing; counting them would make the command check flaky
+UNCOUNTED_COLLECTIONS = {"cache_versions"}
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the commands the process sends to MongoDB, except cache version polls."""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command.get(event.command_name) not in UNCOUNTED_COLLECTIONS:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# The app's clients are created when database.mongo_db_connection is imported, so the scratch
+# database and the listener must be in place before anything from the app is imported.
+os.environ["OMS_DB_NAME"] = BENCHMARK_DB_NAME
+os.environ["OMS_STARTUP_MODE"] = "none"
+command_counter = CommandCounter()
+monitoring.register(command_counter)
+
+import httpx  # noqa: E402
+
+from benchmarks.synthetic_data import DatasetSpec, ORDER_ID_OFFSET, load  # noqa: E402
+from database.mongo_db_connection import client  # noqa: E402
+from database.product_catalog import product_catalog  # noqa: E402
+from database.token_cache import token_cache  # noqa: E402
+from database.user_queries import users_data  # noqa: E402
+from main import app  # noqa: E402
+from utils.constants import card_payload  # noqa: E402
+
+PRODUCTS = 1_000
+USERS_PER_ORDER = 0.1
+NOISE_FLOOR_MS = 2.0  # Latency changes smaller than this never count as regressions
+
+
+class Endpoint(NamedTuple):
+    name: str
+    method: str
+    path: str  # Formatted with the benchmark context (product_id, order_id, ...)
+    role: str = "customer"
+    body: Optional[Callable[[dict], object]] = None
+    setup: Optional[Callable] = None  # Untimed coroutine run before every timed call; returning False stops the endpoint
+    repeat: bool = True  # False for destructive endpoints: measured once, after everything else
+
+
+async def fill_cart(http: httpx.AsyncClient, context: dict) -> None:
+    await http.put("/cart", headers=context["customer"], json=[context["cart_line"]])
+
+
+async def next_pending_order(http: httpx.AsyncClient, context: dict) -> bool:
+    context["pending_order_id"] = next(context["pending_order_ids"], None)
+    return context["pending_order_id"] is not None
+
+
+ENDPOINTS = [
+    Endpoint("GET /products", "GET", "/products"),
+    Endpoint("GET /product/{id}", "GET", "/product/{product_id}"),
+    Endpoint("PUT /cart", "PUT", "/cart", body=lambda context: [context["cart_line"]]),
+    Endpoint("GET /cart", "GET", "/cart"),
+    Endpoint("POST /checkout", "POST", "/checkout", body=lambda context: card_payload, setup=fill_cart),
+    Endpoint("GET /orders", "GET", "/orders"),
+    Endpoint("GET /orders/{id}", "GET", "/orders/{customer_order_id}"),
+    Endpoint("GET /panel/orders", "GET", "/panel/orders", role="admin"),
+    Endpoint("GET /panel/orders?stream", "GET", "/panel/orders?stream=true", role="admin"),
+    Endpoint("GET /panel/orders/status/{status}", "GET", "/panel/orders/status/pending", role="admin"),
+    Endpoint("GET /panel/orders/{id}", "GET", "/panel/orders/{order_id}", role="admin"),
+    Endpoint("PUT /panel/orders/update-status", "PUT", "/panel/orders/update-status", role="admin",
+             body=lambda context: {"order_id": context["pending_order_id"], "new_status": "Processing"},
+             setup=next_pending_order),
+    Endpoint("DELETE /panel/orders", "DELETE", "/panel/orders", role="admin", repeat=False),
+]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def seed(size: int) -> float:
+    started = time.perf_counter()
+    spec = DatasetSpec(users=max(100, int(size * USERS_PER_ORDER)), products=PRODUCTS, orders=size)
+    load(spec, db_name=BENCHMARK_DB_NAME, drop=True)
+    db = client[BENCHMARK_DB_NAME]
+    db["users"].insert_one({key: value for key, value in users_data[2].items() if key != "_id"})  # The demo admin
+    # Nothing cached by the app may survive from the previous size
+    product_catalog.invalidate()
+    token_cache.invalidate()
+    return time.perf_counter() - started
+
+
+def build_context() -> dict:
+    db = client[BENCHMARK_DB_NAME]
+    # The customer with the longest order history, so GET /orders shows how history size matters
+    busiest = next(db["orders"].aggregate([{"$group": {"_id": "$user_id", "orders": {"$sum": 1}}},
+                                           {"$sort": {"orders": -1}}, {"$limit": 1}]))
+    customer = db["users"].find_one({"user_id": busiest["_id"]}, {"token": 1})
+    admin = db["users"].find_one({"role.is_admin": True}, {"token": 1})
+    product = db["products"].find_one({"stock": {"$gte": 1_000}}) or db["products"].find_one({})
+    db["products"].update_one({"product_id": product["product_id"]}, {"$set": {"stock": 10 ** 9}})
+    pending = [order["order_id"] for order in db["orders"].find({"status": "Pending"}, {"order_id": 1})]
+    return {
+        "customer": {"Authorization": f"Bearer {customer['token']}"},
+        "admin": {"Authorization": f"Bearer {admin['token']}"},
+        "product_id": product["product_id"],
+        "cart_line": {"product_id": product["product_id"], "name": product["name"], "quantity": 1},
+        "customer_order_id": db["orders"].find_one({"user_id": busiest["_id"]}, {"order_id": 1})["order_id"],
+        "order_id": ORDER_ID_OFFSET,
+        "pending_order_ids": iter(pending),
+    }
+
+
+async def measure(http: httpx.AsyncClient, endpoint: Endpoint, context: dict, repeat: int) -> dict:
+    latencies, commands, statuses = [], [], set()
+    for _ in range(repeat if endpoint.repeat else 1):
+        if endpoint.setup and await endpoint.setup(http, context) is False:
+            break
+        body = endpoint.body(context) if endpoint.body else None
+        before = command_counter.count
+        started = time.perf_counter()
+        response = await http.request(endpoint.method, endpoint.path.format(**context),
+                                      headers=context[endpoint.role], json=body)
+        await response.aread()  # Streaming endpoints are only done once the body is consumed
+        latencies.append((time.perf_counter() - started) * 1000)
+        commands.append(command_counter.count - before)
+        statuses.add(response.status_code)
+    return {
+        "latency_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "mongo_commands": max(commands) if commands else None,
+        "statuses": sorted(statuses),
+    }
+
+
+async def run_size(size: int, repeat: int) -> dict:
+    seed_seconds = seed(size)
+    context = build_context()
+    results = {}
+    # ASGITransport does not send lifespan events: run startup (indexes on the reseeded database,
+    # notification dispatcher) and shutdown around the measurements as the server would
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://oms", timeout=None) as http:
+        for endpoint in sorted(ENDPOINTS, key=lambda endpoint: not endpoint.repeat):
+            results[endpoint.name] = await measure(http, endpoint, context, repeat)
+            print(f"{size:>9} {endpoint.name:<36} {str(results[endpoint.name]['latency_ms']):>10} ms "
+                  f"{str(results[endpoint.name]['mongo_commands']):>6} cmds")
+    return {"seed_seconds": round(seed_seconds, 1), "peak_rss_mb": peak_rss_mb(), "endpoints": results}
+
+
+def print_curves(report: dict) -> None:
+    sizes = list(report["sizes"])
+    print(f"\n{'latency ms by orders':<36}" + "".join(f"{size:>12}" for size in sizes) + f"{'growth':>9}")
+    for endpoint in ENDPOINTS:
+        latencies = [report["sizes"][size]["endpoints"][endpoint.name]["latency_ms"] for size in sizes]
+        growth = f"{latencies[-1] / latencies[0]:.1f}x" if latencies[0] and latencies[-1] else "-"
+        print(f"{endpoint.name:<36}" + "".join(f"{latency or 0:>12.2f}" for latency in latencies) + f"{growth:>9}")
+    print(f"{'peak RSS MB':<36}" + "".join(f"{report['sizes'][size]['peak_rss_mb']:>12}" for size in sizes))
+
+
+def find_regressions(report: dict, baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+    for size, current in report["sizes"].items():
+        previous = baseline["sizes"].get(size)
+        if not previous:
+            continue
+        for name, result in current["endpoints"].items():
+            before = previous["endpoints"].get(name)
+            if not before or result["latency_ms"] is None or before["latency_ms"] is None:
+                continue
+            slower = result["latency_ms"] - before["latency_ms"]
+            if slower > NOISE_FLOOR_MS and result["latency_ms"] > before["latency_ms"] * (1 + threshold):
+                regressions.append(f"{name} at {size} orders: {before['latency_ms']} -> {result['latency_ms']} ms")
+            if (result["mongo_commands"] or 0) > (before["mongo_commands"] or 0):
+                regressions.append(f"{name} at {size} orders: {before['mongo_commands']} -> "
+                                   f"{result['mongo_commands']} MongoDB commands")
+    return regressions
+
+
+def run_in_fresh_process(size: int, repeat: int) -> dict:
+    # Peak RSS only ever grows within a process, so each size gets its own
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "size.json")
+        subprocess.run([sys.executable, "-m", "benchmarks.scaling_benchmark", "--sizes", str(size),
+                        "--repeat", str(repeat), "--size-report", output], check=True)
+        with open(output) as f:
+            return json.load(f)
+
+
+def run(sizes: List[int], repeat: int) -> dict:
+    report = {"repeat": repeat, "sizes": {}}
+    for size in sorted(sizes):
+        # JSON object keys are strings; use them throughout so baselines compare directly
+        report["sizes"][str(size)] = run_in_fresh_process(size, repeat)
+    client.drop_database(BENCHMARK_DB_NAME)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how each OMS endpoint scales with data size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000], help="Orders")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", help="Compare with this JSON report and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", help="Write this run's JSON report here")
+    parser.add_argument("--size-report", help=argparse.SUPPRESS)  # Internal: measure one size, write its result
+    args = parser.parse_args()
+
+    if args.size_report:
+        size_result = asyncio.run(run_size(args.sizes[0], args.repeat))
+        with open(args.size_report, "w") as f:
+            json.dump(size_result, f)
+        sys.exit(0)
+    result = run(args.sizes, args.repeat)
+    print_curves(result)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = find_regressions(result, json.load(f), args.threshold)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if found else 0)
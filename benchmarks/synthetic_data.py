@@ -0,0 +1,244 @@
+"""
+Synthetic users, products and orders at production scale, for exercising the app and the benchmarks.
+
+Everything is deterministic from the seed: each chunk of documents gets its own random generator,
+so the same spec always produces the same documents no matter how many processes load it.
+Product popularity follows a Zipf law (a few best sellers, a long tail), order status depends on
+the order's age, and cart / order sizes are skewed towards one or two lines.
+
+    python -m benchmarks.synthetic_data --users 1000000 --products 50000 --orders 5000000 --drop
+    python -m benchmarks.synthetic_data --db oms_benchmark --orders 100000 --seed 7
+
+From Python:
+
+    spec = DatasetSpec(users=100_000, products=5_000, orders=1_000_000)
+    for order in iter_documents(spec, "orders"): ...
+    load(spec, db_name="oms_benchmark", drop=True)
+"""
+import argparse
+import base64
+import bisect
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple
+
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+
+from database.cache_versions import bump_version
+from database.indexes import INDEX_REGISTRY
+from database.mongo_db_connection import MONGO_URI, DB_NAME
+from database.product_catalog import PRODUCTS_CACHE_VERSION
+from database.token_cache import USERS_CACHE_VERSION
+from database.user_queries import generate_token
+
+COLLECTIONS = ("products", "users", "orders")
+ORDER_ID_OFFSET = 1_000  # Generated order ids start above the demo orders
+PASSWORD = "Passw0rd"  # Every generated user logs in with user<i>@example.com / Passw0rd
+DATASET_END = datetime(2025, 6, 1)  # Fixed, so created_at does not depend on when the data is generated
+DUPLICATE_KEY_ERROR = 11000
+
+# (probability weight) for 1..5 lines per order or cart
+LINE_COUNT_WEIGHTS = [45, 25, 15, 10, 5]
+QUANTITY_WEIGHTS = [70, 20, 10]  # 1..3 units per line
+CART_PROBABILITY = 0.3
+# Status mix by order age: recent orders are still moving, old ones are mostly delivered
+STATUS_BY_AGE = [
+    (timedelta(days=2), ["Pending", "Processing", "Shipped"], [50, 35, 15]),
+    (timedelta(days=10), ["Processing", "Shipped", "Delivered"], [10, 50, 40]),
+    (timedelta.max, ["Shipped", "Delivered"], [3, 97]),
+]
+
+
+class DatasetSpec(NamedTuple):
+    users: int = 10_000
+    products: int = 1_000
+    orders: int = 100_000
+    seed: int = 42
+    zipf_exponent: float = 1.1
+    days: int = 365  # created_at spread, ending at DATASET_END
+    chunk_size: int = 10_000
+
+
+class ZipfSampler:
+    """Draws product indexes with P(rank k) ~ 1 / k^s; which product holds which rank is shuffled by the seed."""
+
+    def __init__(self, size: int, exponent: float, seed: int):
+        self.ranked = list(range(size))
+        random.Random(seed).shuffle(self.ranked)
+        self.cum_weights = list(itertools.accumulate(1 / rank ** exponent for rank in range(1, size + 1)))
+
+    def sample(self, rng: random.Random, k: int) -> List[int]:
+        total = self.cum_weights[-1]
+        return [self.ranked[bisect.bisect(self.cum_weights, rng.random() * total)] for _ in range(k)]
+
+
+def _chunk_rng(spec: DatasetSpec, collection_name: str, chunk: int) -> random.Random:
+    return random.Random(f"{spec.seed}:{collection_name}:{chunk}")
+
+
+def product_document(spec: DatasetSpec, index: int) -> dict:
+    rng = random.Random(f"{spec.seed}:product:{index}")
+    return {"product_id": f"p{index:07d}", "name": f"Product {index}", "price": round(rng.lognormvariate(3.5, 1.0)) + 1,
+            "stock": rng.randint(0, 1_000)}
+
+
+class _Catalog:
+    # Per-process product table and popularity sampler, built once and shared by every chunk of the spec
+    _cache: Dict[DatasetSpec, "_Catalog"] = {}
+
+    def __init__(self, spec: DatasetSpec):
+        self.products = [product_document(spec, index) for index in range(spec.products)]
+        self.sampler = ZipfSampler(spec.products, spec.zipf_exponent, spec.seed)
+
+    @classmethod
+    def for_spec(cls, spec: DatasetSpec) -> "_Catalog":
+        if spec not in cls._cache:
+            cls._cache[spec] = cls(spec)
+        return cls._cache[spec]
+
+    def lines(self, rng: random.Random) -> List[dict]:
+        count = rng.choices(range(1, len(LINE_COUNT_WEIGHTS) + 1), LINE_COUNT_WEIGHTS)[0]
+        lines = {}
+        for index in self.sampler.sample(rng, count):
+            product = self.products[index]
+            quantity = rng.choices(range(1, len(QUANTITY_WEIGHTS) + 1), QUANTITY_WEIGHTS)[0]
+            line = lines.setdefault(product["product_id"], {"product_id": product["product_id"],
+                                                            "name": product["name"], "price": product["price"],
+                                                            "quantity": 0})
+            line["quantity"] += quantity
+        return list(lines.values())
+
+
+def _user_documents(spec: DatasetSpec, start: int, stop: int, rng: random.Random) -> Iterator[dict]:
+    catalog = _Catalog.for_spec(spec)
+    password = base64.b64encode(PASSWORD.encode()).decode()
+    role = {"is_admin": False}
+    for index in range(start, stop):
+        user_id = f"u{index:08d}"
+        email = f"user{index}@example.com"
+        # Order history is read from the orders collection; the embedded summaries are left empty
+        yield {"user_id": user_id, "full_name": f"User {index}", "email": email, "role": role,
+               "password": password, "token": generate_token(user_id, email, role),
+               "cart": catalog.lines(rng) if rng.random() < CART_PROBABILITY else [], "orders": []}
+
+
+def _order_documents(spec: DatasetSpec, start: int, stop: int, rng: random.Random) -> Iterator[dict]:
+    catalog = _Catalog.for_spec(spec)
+    spread_seconds = spec.days * 86_400
+    for index in range(start, stop):
+        age = timedelta(seconds=rng.random() * spread_seconds)
+        for max_age, statuses, weights in STATUS_BY_AGE:
+            if age < max_age:
+                status = rng.choices(statuses, weights)[0]
+                break
+        created_at = (DATASET_END - age).replace(microsecond=0)
+        items = catalog.lines(rng)
+        yield {"order_id": ORDER_ID_OFFSET + index, "user_id": f"u{rng.randrange(spec.users):08d}", "items": items,
+               "total_price": sum(item["price"] * item["quantity"] for item in items), "status": status,
+               "created_at": created_at,
+               "updated_at": min(created_at + timedelta(hours=rng.randint(0, 72)), DATASET_END)}
+
+
+def chunk_documents(spec: DatasetSpec, collection_name: str, chunk: int) -> Iterator[dict]:
+    """The documents of one chunk, generated lazily; the same (spec, collection, chunk) always yields the same documents."""
+    count = getattr(spec, collection_name)
+    start = chunk * spec.chunk_size
+    stop = min(start + spec.chunk_size, count)
+    if collection_name == "products":
+        return (product_document(spec, index) for index in range(start, stop))
+    builders = {"users": _user_documents, "orders": _order_documents}
+    return builders[collection_name](spec, start, stop, _chunk_rng(spec, collection_name, chunk))
+
+
+def chunk_count(spec: DatasetSpec, collection_name: str) -> int:
+    return -(-getattr(spec, collection_name) // spec.chunk_size)
+
+
+def iter_documents(spec: DatasetSpec, collection_name: str) -> Iterator[dict]:
+    for chunk in range(chunk_count(spec, collection_name)):
+        yield from chunk_documents(spec, collection_name, chunk)
+
+
+_worker_clients: Dict[str, MongoClient] = {}
+
+
+def _load_chunk(spec: DatasetSpec, collection_name: str, chunk: int, uri: str, db_name: str) -> int:
+    # Runs in a worker process: one client per process, one unordered insert_many per chunk
+    if uri not in _worker_clients:
+        _worker_clients[uri] = MongoClient(uri)
+    collection = _worker_clients[uri][db_name][collection_name]
+    documents = list(chunk_documents(spec, collection_name, chunk))
+    if not documents:
+        return 0
+    try:
+        return len(collection.insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as error:
+        # Re-running the same spec: documents that are already there are skipped
+        if any(write_error["code"] != DUPLICATE_KEY_ERROR for write_error in error.details["writeErrors"]):
+            raise
+        return error.details["nInserted"]
+
+
+def load(spec: DatasetSpec, db_name: str = DB_NAME, uri: str = MONGO_URI, workers: int = None,
+         drop: bool = False) -> dict:
+    """
+    Insert the dataset into db_name with chunks spread over worker processes, then create the
+    registry indexes and move the order id tracker past the generated ids.
+    Returns {"inserted": {collection: count}, "seconds": {collection: duration}}.
+    """
+    client = MongoClient(uri)
+    db = client[db_name]
+    if drop:
+        for collection_name in COLLECTIONS:
+            db.drop_collection(collection_name)
+
+    result = {"inserted": {}, "seconds": {}}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for collection_name in COLLECTIONS:
+            started = time.perf_counter()
+            chunks = range(chunk_count(spec, collection_name))
+            futures = [executor.submit(_load_chunk, spec, collection_name, chunk, uri, db_name) for chunk in chunks]
+            result["inserted"][collection_name] = sum(future.result() for future in futures)
+            result["seconds"][collection_name] = round(time.perf_counter() - started, 2)
+
+    # Building indexes once after the load is much cheaper than maintaining them during it
+    started = time.perf_counter()
+    for collection_name, models in INDEX_REGISTRY.items():
+        db[collection_name].create_indexes(models)
+    result["seconds"]["indexes"] = round(time.perf_counter() - started, 2)
+
+    if spec.orders:
+        db["orders_tracker"].update_one({}, {"$max": {"last_order": ORDER_ID_OFFSET + spec.orders - 1}}, upsert=True)
+    if db_name == DB_NAME:
+        # Running app workers drop their cached tokens and product catalog
+        bump_version(USERS_CACHE_VERSION)
+        bump_version(PRODUCTS_CACHE_VERSION)
+    client.close()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and load a synthetic OMS dataset")
+    defaults = DatasetSpec()
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--products", type=int, default=defaults.products)
+    parser.add_argument("--orders", type=int, default=defaults.orders)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--zipf-exponent", type=float, default=defaults.zipf_exponent)
+    parser.add_argument("--days", type=int, default=defaults.days)
+    parser.add_argument("--chunk-size", type=int, default=defaults.chunk_size)
+    parser.add_argument("--db", default=DB_NAME, help="Target database (default: the app's)")
+    parser.add_argument("--uri", default=MONGO_URI)
+    parser.add_argument("--workers", type=int, default=None, help="Loader processes (default: CPU count)")
+    parser.add_argument("--drop", action="store_true", help="Drop users, products and orders first")
+    args = parser.parse_args()
+    spec = DatasetSpec(args.users, args.products, args.orders, args.seed, args.zipf_exponent, args.days,
+                       args.chunk_size)
+    summary = load(spec, args.db, args.uri, args.workers, args.drop)
+    for name, seconds in summary["seconds"].items():
+        print(f"{name:<10} {summary['inserted'].get(name, ''):>10} {seconds:>8.2f} s")
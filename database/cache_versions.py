@@ -0,0 +1,60 @@
+import time
+from typing import Optional
+
+from bson import ObjectId
+
+from database.mongo_db_connection import cache_versions_collection, async_cache_versions_collection
+
+# Every worker keeps its own in-memory caches; a shared version stamp per cache
+# tells the other workers when their copy went stale.
+# A fresh ObjectId (not a counter) is used, so dropping the collection never
+# brings an old stamp back to life.
+
+
+def bump_version(name: str) -> ObjectId:
+    version = ObjectId()
+    cache_versions_collection.update_one({"_id": name}, {"$set": {"version": version}}, upsert=True)
+    return version
+
+
+async def bump_version_async(name: str) -> ObjectId:
+    version = ObjectId()
+    await async_cache_versions_collection.update_one({"_id": name}, {"$set": {"version": version}}, upsert=True)
+    return version
+
+
+async def get_version_async(name: str) -> Optional[ObjectId]:
+    document = await async_cache_versions_collection.find_one({"_id": name})
+    return document["version"] if document else None
+
+
+class VersionWatcher:
+    """
+    Polls one version stamp, at most once per check_interval seconds.
+    poll() returns True when the stamp differs from the last one seen (or was never read),
+    which is the signal for the owning cache to drop its contents.
+    """
+
+    def __init__(self, name: str, check_interval: float):
+        self.name = name
+        self.check_interval = check_interval
+        self.version = None
+        self._seen = False
+        self._checked_at = None
+
+    async def poll(self) -> bool:
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        version = await get_version_async(self.name)
+        if not self._seen or version != self.version:
+            self.version = version
+            self._seen = True
+            return True
+        return False
+
+    def reset(self) -> None:
+        # Re-read the stamp on the next poll and report it as changed
+        self._checked_at = None
+        self._seen = False
@@ -0,0 +1,125 @@
+"""
+Declarative index registry for the OMS collections.
+
+Applied idempotently on startup (see lifespan in main.py) and inspectable from the command line:
+
+    python -m database.indexes show     # indexes currently in MongoDB
+    python -m database.indexes diff     # what apply would create / rebuild / leave alone
+    python -m database.indexes apply    # bring MongoDB in line with the registry
+"""
+import argparse
+from typing import Dict, List
+
+from pymongo import ASCENDING, IndexModel
+
+from database.mongo_db_connection import db, async_db
+
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("orders.order_id", ASCENDING)], name="orders_order_id"),
+    ],
+    "products": [
+        IndexModel([("product_id", ASCENDING)], name="product_id_unique", unique=True),
+    ],
+    "orders": [
+        IndexModel([("order_id", ASCENDING)], name="order_id_unique", unique=True),
+        # Admin listing: keyset pagination over (created_at, order_id)
+        IndexModel([("created_at", ASCENDING), ("order_id", ASCENDING)], name="created_at_order_id"),
+        # get_orders_by_status: equality on status, range/sort on created_at, order_id as the keyset tie-breaker
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING), ("order_id", ASCENDING)],
+                   name="status_created_at"),
+        # Customer order history: GET /orders pages through one user's orders
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING), ("order_id", ASCENDING)],
+                   name="user_id_created_at"),
+    ],
+    "notifications_outbox": [
+        # Dispatcher claims: ready pending notifications and expired leases
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+        IndexModel([("order_id", ASCENDING)], name="order_id"),
+    ],
+}
+
+
+def _spec(index: dict) -> dict:
+    # Only the options the registry controls take part in the comparison
+    return {"key": [tuple(part) for part in index["key"]], "unique": bool(index.get("unique", False))}
+
+
+def diff_indexes(collection_name: str, existing: dict) -> dict:
+    """
+    Compare index_information() output of a collection with the registry.
+    Returns the registry models to create, the names to rebuild (same name, different spec)
+    and the names that exist in MongoDB but not in the registry (reported, never dropped).
+    """
+    wanted = {model.document["name"]: model for model in INDEX_REGISTRY.get(collection_name, [])}
+    result = {"create": [], "rebuild": [], "unchanged": [], "extra": []}
+    for name, model in wanted.items():
+        if name not in existing:
+            result["create"].append(model)
+        elif _spec(existing[name]) != _spec({"key": list(model.document["key"].items()),
+                                             "unique": model.document.get("unique")}):
+            result["rebuild"].append(model)
+        else:
+            result["unchanged"].append(name)
+    result["extra"] = [name for name in existing if name not in wanted and name != "_id_"]
+    return result
+
+
+def ensure_indexes() -> None:
+    for collection_name in INDEX_REGISTRY:
+        collection = db[collection_name]
+        changes = diff_indexes(collection_name, collection.index_information())
+        for model in changes["rebuild"]:
+            collection.drop_index(model.document["name"])
+        models = changes["create"] + changes["rebuild"]
+        if models:
+            collection.create_indexes(models)
+
+
+async def ensure_indexes_async() -> None:
+    for collection_name in INDEX_REGISTRY:
+        collection = async_db[collection_name]
+        changes = diff_indexes(collection_name, await collection.index_information())
+        for model in changes["rebuild"]:
+            await collection.drop_index(model.document["name"])
+        models = changes["create"] + changes["rebuild"]
+        if models:
+            await collection.create_indexes(models)
+            print(f"Created indexes on {collection_name}: {', '.join(m.document['name'] for m in models)}")
+
+
+def show_indexes() -> None:
+    for collection_name in sorted(set(INDEX_REGISTRY) | set(db.list_collection_names())):
+        print(f"{collection_name}:")
+        for name, index in db[collection_name].index_information().items():
+            unique = " unique" if index.get("unique") else ""
+            print(f"  {name}: {index['key']}{unique}")
+
+
+def print_diff() -> None:
+    for collection_name in INDEX_REGISTRY:
+        changes = diff_indexes(collection_name, db[collection_name].index_information())
+        print(f"{collection_name}:")
+        for model in changes["create"]:
+            print(f"  + {model.document['name']}")
+        for model in changes["rebuild"]:
+            print(f"  ~ {model.document['name']}")
+        for name in changes["unchanged"]:
+            print(f"  = {name}")
+        for name in changes["extra"]:
+            print(f"  ? {name} (not in registry)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and apply the OMS index registry")
+    parser.add_argument("command", choices=["show", "diff", "apply"])
+    args = parser.parse_args()
+    if args.command == "show":
+        show_indexes()
+    elif args.command == "diff":
+        print_diff()
+    else:
+        ensure_indexes()
+        print_diff()
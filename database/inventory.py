@@ -0,0 +1,76 @@
+import asyncio
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+from database.mongo_db_connection import async_products_collection
+
+
+def aggregate_quantities(items: List[dict]) -> Dict[str, int]:
+    # One entry per product, summing repeated lines
+    quantities = {}
+    for item in items:
+        quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+    return quantities
+
+
+async def _decrement_one_async(product_id: str, quantity: int) -> bool:
+    # Conditional decrement: only matches while stock >= quantity; a missing product never matches
+    result = await async_products_collection.update_one(
+        {"product_id": product_id, "stock": {"$gte": quantity}}, {"$inc": {"stock": -quantity}}
+    )
+    return result.matched_count == 1
+
+
+async def restock_async(quantities: Dict[str, int]) -> None:
+    # Give back stock taken by decrement_stock_async, in one unordered bulk_write
+    if quantities:
+        await async_products_collection.bulk_write([
+            UpdateOne({"product_id": product_id}, {"$inc": {"stock": quantity}})
+            for product_id, quantity in quantities.items()
+        ], ordered=False)
+
+
+async def decrement_stock_async(quantities: Dict[str, int]) -> List[dict]:
+    """
+    Decrement stock for every product, all-or-nothing. The per-product conditional updates run
+    concurrently, so concurrent callers can never drive stock negative and each product's
+    matched_count says whether its decrement applied. If any product is short (or missing), the
+    decrements that did apply are compensated and the shortages are returned as
+    [{"product_id", "name", "requested", "available"}]; an empty list means success.
+    Runs without a transaction, so it works on a standalone mongod.
+    """
+    product_ids = list(quantities)
+    if not product_ids:
+        return []
+    applied = await asyncio.gather(*(_decrement_one_async(product_id, quantities[product_id])
+                                     for product_id in product_ids))
+    if all(applied):
+        return []
+
+    # Put back what the successful lines took
+    await restock_async({product_id: quantities[product_id] for product_id, ok in zip(product_ids, applied) if ok})
+
+    # Failure path only: report what is left of the short products (available is None for a missing product)
+    short_ids = [product_id for product_id, ok in zip(product_ids, applied) if not ok]
+    products = async_products_collection.find({"product_id": {"$in": short_ids}}, {"_id": 0, "product_id": 1,
+                                                                                  "name": 1, "stock": 1})
+    current = {product["product_id"]: product async for product in products}
+    return [
+        {"product_id": product_id, "name": current.get(product_id, {}).get("name"),
+         "requested": quantities[product_id], "available": current.get(product_id, {}).get("stock")}
+        for product_id in short_ids
+    ]
+
+
+async def take_stock_for_shipment_async(orders: List[dict]) -> List[dict]:
+    """
+    Decrement stock for every line of the shipped orders, aggregated per product, in one
+    all-or-nothing batch. Returns the shortages (empty on success); nothing is taken on shortage.
+    """
+    return await decrement_stock_async(aggregate_quantities([item for order in orders for item in order["items"]]))
+
+
+async def return_stock_for_shipment_async(orders: List[dict]) -> None:
+    """Undo take_stock_for_shipment_async for orders that did not ship after all."""
+    await restock_async(aggregate_quantities([item for order in orders for item in order["items"]]))
@@ -1,17 +1,41 @@
-from pymongo import MongoClient
+import os
 
-# Default connection string (do not use production)
-MONGO_URI = "mongodb://localhost:27017/"
+from pymongo import AsyncMongoClient, MongoClient
 
-# Initialize MongoDB connection
+from observability.mongo import command_metrics_listener
+from observability.slow_queries import slow_query_recorder
+
+# Default connection string (do not use production); both can be overridden, e.g. to point the app at a scratch database
+MONGO_URI = os.environ.get("OMS_MONGO_URI", "mongodb://localhost:27017/")
+DB_NAME = os.environ.get("OMS_DB_NAME", "oms_db")
+
+# Initialize MongoDB connection (blocking client, used by scripts and tests)
 client = MongoClient(MONGO_URI)
-db = client["oms_db"]
+db = client[DB_NAME]
 
 # Collection references
 users_collection = db["users"]
 products_collection = db["products"]
 orders_collection = db["orders"]
 orders_tracker_collection = db["orders_tracker"]
+cache_versions_collection = db["cache_versions"]
+notifications_outbox_collection = db["notifications_outbox"]
+seed_state_collection = db["seed_state"]
+
+# Non-blocking client used by the FastAPI app, so a slow query never stalls the event loop.
+# Its commands are counted and timed per route (see /metrics); slow ones are recorded and explained.
+async_client = AsyncMongoClient(MONGO_URI, event_listeners=[command_metrics_listener, slow_query_recorder])
+slow_query_recorder.client = async_client  # Runs the sampled explains of slow commands
+async_db = async_client[DB_NAME]
+
+# Async collection references
+async_users_collection = async_db["users"]
+async_products_collection = async_db["products"]
+async_orders_collection = async_db["orders"]
+async_orders_tracker_collection = async_db["orders_tracker"]
+async_cache_versions_collection = async_db["cache_versions"]
+async_notifications_outbox_collection = async_db["notifications_outbox"]
+async_seed_state_collection = async_db["seed_state"]
 
 
 def clean_collections():
@@ -19,3 +43,10 @@ def clean_collections():
     for collection in collections:
         db.drop_collection(collection)
         print(f"Collection {collection} has been removed.")
+
+
+async def clean_collections_async():
+    collections = await async_db.list_collection_names()
+    for collection in collections:
+        await async_db.drop_collection(collection)
+        print(f"Collection {collection} has been removed.")
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from database.mongo_db_connection import async_notifications_outbox_collection
+
+# Outbox states: pending -> sending (leased by a dispatcher worker) -> sent | failed
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+
+def build_notification(to: str, message: str, order_id: Optional[int] = None) -> dict:
+    now = datetime.now()
+    return {"to": to, "message": message, "order_id": order_id, "status": PENDING, "attempts": 0,
+            "created_at": now, "next_attempt_at": now}
+
+
+async def enqueue_notifications_async(notifications: List[dict]) -> int:
+    if not notifications:
+        return 0
+    await async_notifications_outbox_collection.insert_many(notifications)
+    return len(notifications)
+
+
+async def claim_notifications_async(limit: int, lease_seconds: float) -> List[dict]:
+    """
+    Lease up to `limit` ready notifications to the caller. Pending notifications whose
+    next_attempt_at has passed and notifications whose lease expired (crashed worker) are claimable.
+    """
+    now = datetime.now()
+    claimable = {"$or": [
+        {"status": PENDING, "next_attempt_at": {"$lte": now}},
+        {"status": SENDING, "next_attempt_at": {"$lte": now}},  # next_attempt_at is the lease expiry while sending
+    ]}
+    candidates = await async_notifications_outbox_collection.find(claimable, {"_id": 1}).limit(limit).to_list(None)
+    if not candidates:
+        return []
+    claim = ObjectId()
+    await async_notifications_outbox_collection.update_many(
+        {"$and": [{"_id": {"$in": [candidate["_id"] for candidate in candidates]}}, claimable]},
+        {"$set": {"status": SENDING, "claim": claim, "next_attempt_at": now + timedelta(seconds=lease_seconds)}}
+    )
+    return await async_notifications_outbox_collection.find({"claim": claim, "status": SENDING}).to_list(None)
+
+
+async def record_results_async(sent: List[dict], failed: List[dict], max_attempts: int, retry_delay_seconds: float):
+    # sent: notifications delivered; failed: notifications whose attempt raised (with "error" set)
+    now = datetime.now()
+    operations = [
+        UpdateOne({"_id": notification["_id"]},
+                  {"$set": {"status": SENT, "sent_at": now}, "$inc": {"attempts": 1}, "$unset": {"claim": ""}})
+        for notification in sent
+    ]
+    for notification in failed:
+        attempts = notification["attempts"] + 1
+        final = attempts >= max_attempts
+        operations.append(UpdateOne({"_id": notification["_id"]}, {
+            "$set": {"status": FAILED if final else PENDING, "last_error": notification["error"], "attempts": attempts,
+                     # Exponential backoff between attempts
+                     "next_attempt_at": now + timedelta(seconds=retry_delay_seconds * 2 ** (attempts - 1))},
+            "$unset": {"claim": ""},
+        }))
+    if operations:
+        await async_notifications_outbox_collection.bulk_write(operations, ordered=False)
+
+
+async def count_notifications_by_status_async() -> dict:
+    counts = await async_notifications_outbox_collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])
+    return {entry["_id"]: entry["count"] async for entry in counts}
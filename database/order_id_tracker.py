@@ -1,9 +1,20 @@
+import asyncio
+import os
 from typing import Optional
 
-from database.mongo_db_connection import orders_tracker_collection
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database.mongo_db_connection import orders_tracker_collection, async_orders_tracker_collection
 
 # Initial order tracker data
 order_tracker_data = {"last_order": 4}
+ORDER_TRACKER_ID = "order_tracker"  # Fixed _id for a seeded tracker, so concurrent workers cannot create two
+
+# How many order ids a worker reserves per round trip to the tracker (OMS_ORDER_ID_BLOCK_SIZE).
+# 1 keeps ids strictly sequential; larger blocks (hi/lo) remove the tracker document as a hot spot,
+# at the cost of gaps (ids a worker reserved but never used) and of ids not following creation order across workers.
+ORDER_ID_BLOCK_SIZE = int(os.environ.get("OMS_ORDER_ID_BLOCK_SIZE", "1"))
 
 
 def insert_orders_tracker():
@@ -18,11 +29,102 @@ def get_last_order_id() -> Optional[int]:
 
 
 def update_last_order_id() -> int:
-    result = orders_tracker_collection.update_one({}, {"$inc": {"last_order": 1}})
-
-    if result.matched_count == 0:  # If no document exists, create one
+    # Increment and read back in one atomic operation, so concurrent callers never share an id
+    tracker = orders_tracker_collection.find_one_and_update(
+        {}, {"$inc": {"last_order": 1}}, return_document=ReturnDocument.AFTER
+    )
+    if tracker is None:  # If no document exists, create one
         insert_orders_tracker()
-        # Increment the last_order immediately after inserting
-        result = orders_tracker_collection.update_one({}, {"$inc": {"last_order": 1}})
-    # Retrieve and return the updated order ID immediately after the increment
-    return get_last_order_id()  # Retrieve and return the new order ID
+        tracker = orders_tracker_collection.find_one_and_update(
+            {}, {"$inc": {"last_order": 1}}, return_document=ReturnDocument.AFTER
+        )
+    return tracker["last_order"]
+
+
+########## Async API (used by the FastAPI app) ##########
+async def insert_orders_tracker_async():
+    # Upsert on the fixed _id, so concurrent workers can never create two trackers
+    result = await async_orders_tracker_collection.update_one(
+        {"_id": ORDER_TRACKER_ID}, {"$setOnInsert": dict(order_tracker_data)}, upsert=True)
+    if result.upserted_id is not None:
+        order_id_allocator.reset()  # A block reserved from the old tracker is no longer valid
+        print("Inserted initial order tracker.")
+
+
+async def seed_orders_tracker_async() -> bool:
+    """
+    Idempotent variant of insert_orders_tracker_async for existing databases: creates the tracker
+    if there is none and otherwise only raises last_order to the seeded value, never lowers it.
+    Returns True if the tracker changed.
+    """
+    tracker = await async_orders_tracker_collection.find_one({}, {"_id": 1})
+    if tracker is None:
+        try:
+            await async_orders_tracker_collection.insert_one({"_id": ORDER_TRACKER_ID, **order_tracker_data})
+            changed = True
+        except DuplicateKeyError:
+            changed = False  # Another worker seeded it first
+    else:
+        result = await async_orders_tracker_collection.update_one(
+            {"_id": tracker["_id"]}, {"$max": {"last_order": order_tracker_data["last_order"]}})
+        changed = result.modified_count > 0
+    if changed:
+        order_id_allocator.reset()
+    return changed
+
+
+async def reserve_order_ids_async(count: int = 1) -> int:
+    """Atomically reserve `count` consecutive order ids and return the highest one."""
+    tracker = await async_orders_tracker_collection.find_one_and_update(
+        {}, {"$inc": {"last_order": count}}, return_document=ReturnDocument.AFTER
+    )
+    if tracker is None:
+        # No tracker yet: create it (starting from the seeded value) and reserve in one upsert on the
+        # fixed _id, so workers racing here share one tracker and never hand out the same ids
+        create_and_reserve = [{"$set": {"last_order": {"$add": [
+            {"$ifNull": ["$last_order", order_tracker_data["last_order"]]}, count]}}}]
+        try:
+            tracker = await async_orders_tracker_collection.find_one_and_update(
+                {"_id": ORDER_TRACKER_ID}, create_and_reserve, upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:  # Lost the insert race; the tracker exists now
+            tracker = await async_orders_tracker_collection.find_one_and_update(
+                {"_id": ORDER_TRACKER_ID}, create_and_reserve, return_document=ReturnDocument.AFTER)
+    return tracker["last_order"]
+
+
+class OrderIdAllocator:
+    """
+    Hands out order ids from a block reserved in one round trip (hi/lo).
+    With block_size=1 every call is a single atomic find_one_and_update, without a lock.
+    """
+
+    def __init__(self, block_size: int = ORDER_ID_BLOCK_SIZE):
+        self.block_size = block_size
+        self._next = 0
+        self._high = -1  # Empty block
+        self._lock = asyncio.Lock()
+
+    async def next_id(self) -> int:
+        if self.block_size == 1:
+            return await reserve_order_ids_async(1)  # Nothing held in memory, so nothing to lock
+        while self._next > self._high:
+            # Only refilling the block is serialized; handing out an id from it never awaits
+            async with self._lock:
+                if self._next > self._high:  # Another caller may have refilled it while this one waited
+                    high = await reserve_order_ids_async(self.block_size)
+                    self._high, self._next = high, high - self.block_size + 1
+        order_id = self._next
+        self._next += 1
+        return order_id
+
+    def reset(self) -> None:
+        # Forget the reserved block, e.g. after the tracker was re-seeded
+        self._next = 0
+        self._high = -1
+
+
+order_id_allocator = OrderIdAllocator()
+
+
+async def update_last_order_id_async() -> int:
+    return await order_id_allocator.next_id()
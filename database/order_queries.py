@@ -1,6 +1,10 @@
+import base64
+import json
 from typing import Optional, List
 from datetime import datetime
-from database.mongo_db_connection import orders_collection
+from bson import ObjectId
+from pymongo import ReturnDocument
+from database.mongo_db_connection import orders_collection, async_orders_collection
 
 orders_data = [
     {
@@ -64,7 +68,7 @@ def create_order(order_data):
     return str(result.inserted_id)
 
 
-def get_orders_by_status(status: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
+def build_orders_by_status_query(status: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
     # Prepare the query
     query = {"status": status}
 
@@ -87,6 +91,12 @@ def get_orders_by_status(status: str, start_date: Optional[str] = None, end_date
 
         query["created_at"] = date_filter  # Apply both start_date and end_date if provided
 
+    return query
+
+
+def get_orders_by_status(status: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
+    query = build_orders_by_status_query(status, start_date, end_date)
+
     # Fetch orders from the database
     orders_cursor = orders_collection.find(query)
     orders = [
@@ -152,3 +162,163 @@ def delete_order_by_id_admin(order_id: int):
 def delete_all_orders():
     result = orders_collection.delete_many({})  # Deletes all documents in the collection
     return result.deleted_count > 0
+
+
+# Keyset pagination over (created_at, order_id), backed by the created_at_order_id and
+# status_created_at indexes, so every page costs the same however deep it is
+ORDER_PAGE_SORT = [("created_at", 1), ("order_id", 1)]
+DEFAULT_ORDER_PAGE_SIZE = 100
+MAX_ORDER_PAGE_SIZE = 1000
+
+
+def encode_order_cursor(order: dict) -> str:
+    position = {"created_at": order["created_at"].isoformat(), "order_id": order["order_id"]}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_order_cursor(cursor: str) -> dict:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {"created_at": datetime.fromisoformat(position["created_at"]), "order_id": int(position["order_id"])}
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor.")
+
+
+def after_cursor_query(query: dict, cursor: Optional[str]) -> dict:
+    if not cursor:
+        return query
+    position = decode_order_cursor(cursor)
+    after = {"$or": [
+        {"created_at": {"$gt": position["created_at"]}},
+        {"created_at": position["created_at"], "order_id": {"$gt": position["order_id"]}},
+    ]}
+    return {"$and": [query, after]} if query else after
+
+########## Async API (used by the FastAPI app) ##########
+async def insert_orders_async():
+    await async_orders_collection.insert_many([dict(order) for order in orders_data])
+
+
+async def create_order_async(order_data):
+    order_data['created_at'] = datetime.now()
+    order_data['updated_at'] = datetime.now()
+    result = await async_orders_collection.insert_one(order_data)
+    return str(result.inserted_id)
+
+
+async def get_order_by_id_async(order_id: int):
+    try:
+        order = await async_orders_collection.find_one({"order_id": order_id})
+        if order:
+            order["order_id"] = order_id  # Ensure the order_id is correct
+        return order
+    except Exception as e:
+        return {"error": str(e)}
+
+
+async def get_user_order_async(user_id: str, order_id: int, projection: Optional[dict] = None):
+    # Scoped to the owner, so customers can only read their own orders
+    return await async_orders_collection.find_one({"order_id": order_id, "user_id": user_id}, projection)
+
+
+async def transition_order_status_async(order_id: int, expected_status: str, new_status: str):
+    """
+    Compare-and-set: move the order to new_status only if it is still in expected_status.
+    Returns the updated order, or None when the order is missing or in another status.
+    """
+    return await async_orders_collection.find_one_and_update(
+        {"order_id": order_id, "status": expected_status},
+        {"$set": {"status": new_status, "updated_at": datetime.now()}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def bulk_transition_order_status_async(order_ids: List[int], expected_status: str, new_status: str) -> set:
+    """
+    Compare-and-set for many orders in one statement; returns the ids that were moved.
+    Every call stamps its own transition_id, which identifies this call's changes when some orders
+    were moved concurrently, and removes it again once the moved orders are known.
+    """
+    if not order_ids:
+        return set()
+    transition_id = str(ObjectId())
+    result = await async_orders_collection.update_many(
+        {"order_id": {"$in": order_ids}, "status": expected_status},
+        {"$set": {"status": new_status, "updated_at": datetime.now(), "transition_id": transition_id}}
+    )
+    if result.modified_count == len(order_ids):
+        moved = set(order_ids)
+    else:
+        moved_orders = async_orders_collection.find({"order_id": {"$in": order_ids}, "transition_id": transition_id},
+                                                    {"order_id": 1})
+        moved = {order["order_id"] async for order in moved_orders}
+    if moved:  # The stamp has done its job; it must not show up in order listings
+        await async_orders_collection.update_many({"order_id": {"$in": list(moved)}, "transition_id": transition_id},
+                                                  {"$unset": {"transition_id": ""}})
+    return moved
+
+
+async def revert_order_status_async(order_ids: List[int], from_status: str, to_status: str):
+    # Compensation for a transition whose side effects could not be applied
+    if order_ids:
+        await async_orders_collection.update_many(
+            {"order_id": {"$in": order_ids}, "status": from_status},
+            {"$set": {"status": to_status, "updated_at": datetime.now()}}
+        )
+
+
+async def delete_order_by_id_admin_async(order_id: int):
+    try:
+        delete_result = await async_orders_collection.delete_one({"order_id": order_id})
+
+        if delete_result.deleted_count == 0:
+            return {"error": "Order not found or already deleted"}
+
+        return {"message": f"Order {order_id} deleted successfully."}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+async def get_orders_page_async(query: dict, limit: int = DEFAULT_ORDER_PAGE_SIZE, cursor: Optional[str] = None,
+                                projection: Optional[dict] = None):
+    """
+    One page of orders matching query, in (created_at, order_id) order.
+    A projection must keep created_at and order_id (the cursor is built from them).
+    Returns (orders, next_cursor); next_cursor is None on the last page.
+    """
+    orders_cursor = async_orders_collection.find(after_cursor_query(query, cursor), projection) \
+        .sort(ORDER_PAGE_SORT).limit(limit + 1)
+    orders = [
+        {**order, "_id": str(order["_id"])} if "_id" in order else order  # Convert ObjectId to string
+        async for order in orders_cursor
+    ]
+    next_cursor = encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return orders[:limit], next_cursor
+
+
+DEFAULT_STREAM_BATCH_SIZE = 500
+
+
+async def stream_orders_async(query: dict, batch_size: int = DEFAULT_STREAM_BATCH_SIZE, cursor: Optional[str] = None):
+    # Yield orders straight from the MongoDB cursor, batch_size documents per round trip, never holding the full result
+    orders_cursor = async_orders_collection.find(after_cursor_query(query, cursor)).sort(ORDER_PAGE_SORT)
+    async for order in orders_cursor.batch_size(batch_size):
+        yield order
+
+
+async def iter_order_batches_async(batch_size: int, projection: Optional[dict] = None, query: Optional[dict] = None):
+    # Walk the matching orders (the whole collection by default) as lists of at most batch_size orders
+    batch = []
+    async for order in async_orders_collection.find(query or {}, projection).batch_size(batch_size):
+        batch.append(order)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def delete_orders_by_ids_async(ids: list) -> int:
+    # ids are MongoDB _id values, so orders created after the scan are never removed unseen
+    result = await async_orders_collection.delete_many({"_id": {"$in": ids}})
+    return result.deleted_count
@@ -0,0 +1,58 @@
+import asyncio
+import json
+from typing import Dict, List, Optional
+
+from database.cache_versions import VersionWatcher
+from database.mongo_db_connection import async_products_collection
+
+PRODUCTS_CACHE_VERSION = "products"  # Bumped on any catalog write (new products, name or price changes)
+CATALOG_VERSION_CHECK_SECONDS = 5
+
+# Fields that make up a catalog record. Stock is deliberately not cached: it changes on every
+# checkout and is always read live from MongoDB where it matters (checkout, shipping).
+CATALOG_FIELDS = ("product_id", "name", "price")
+
+
+class ProductCatalog:
+    """
+    In-memory copy of the product catalog (product_id -> {product_id, name, price}).
+    Reloaded from MongoDB when the shared products version stamp changes; the /products
+    response body is serialized once per catalog version.
+    """
+
+    def __init__(self, version_check_interval: float = CATALOG_VERSION_CHECK_SECONDS):
+        self._products: Dict[str, dict] = {}
+        self._products_json: Optional[bytes] = None
+        self._watcher = VersionWatcher(PRODUCTS_CACHE_VERSION, version_check_interval)
+        self._lock = asyncio.Lock()  # Concurrent requests wait for one reload instead of seeing an empty catalog
+
+    async def _ensure_fresh(self) -> None:
+        async with self._lock:
+            if await self._watcher.poll():
+                projection = {"_id": 0, **{field: 1 for field in CATALOG_FIELDS}}
+                products = await async_products_collection.find({}, projection).to_list(None)
+                self._products = {product["product_id"]: product for product in products}
+                self._products_json = json.dumps({"products": products}).encode("utf-8")
+
+    async def get(self, product_id: str) -> Optional[dict]:
+        await self._ensure_fresh()
+        return self._products.get(product_id)
+
+    async def get_many(self, product_ids) -> Dict[str, dict]:
+        await self._ensure_fresh()
+        return {product_id: self._products[product_id] for product_id in product_ids if product_id in self._products}
+
+    async def all(self) -> List[dict]:
+        await self._ensure_fresh()
+        return list(self._products.values())
+
+    async def products_json(self) -> bytes:
+        """Pre-serialized {"products": [...]} body for GET /products."""
+        await self._ensure_fresh()
+        return self._products_json
+
+    def invalidate(self) -> None:
+        self._watcher.reset()
+
+
+product_catalog = ProductCatalog()
@@ -1,4 +1,6 @@
-from database.mongo_db_connection import products_collection
+from database.cache_versions import bump_version, bump_version_async
+from database.mongo_db_connection import products_collection, async_products_collection
+from database.product_catalog import product_catalog, PRODUCTS_CACHE_VERSION
 
 products_data = [
     {"product_id": "p001", "name": "Laptop", "price": 1200, "stock": 100},
@@ -13,6 +15,7 @@ products_data = [
 
 def insert_products():
     products_collection.insert_many(products_data)
+    bump_version(PRODUCTS_CACHE_VERSION)  # Lets every app worker reload its catalog
 
 
 def update_product_stock(product_id, new_stock):
@@ -27,3 +30,17 @@ def update_product_stock(product_id, new_stock):
         return f"Stock for product {product_id} updated successfully."
     else:
         return f"Product {product_id} not found or stock is already the same."
+
+
+########## Async API (used by the FastAPI app) ##########
+async def insert_products_async():
+    await async_products_collection.insert_many([dict(product) for product in products_data])
+    await invalidate_product_catalog_async()
+
+
+async def invalidate_product_catalog_async():
+    # Call after any write to a product's catalog fields (name, price) or to the set of products.
+    # Stock-only writes need not call this: stock is not part of the cached catalog.
+    await bump_version_async(PRODUCTS_CACHE_VERSION)
+    product_catalog.invalidate()
+
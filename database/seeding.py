@@ -0,0 +1,114 @@
+"""
+What the app does with the database on startup, selected by OMS_STARTUP_MODE:
+
+    reset          drop every collection and insert the demo dataset (default; what tests_api expects)
+    seed-if-empty  keep existing data; the demo documents are only added to collections that are still
+                   empty (a populated collection, e.g. one whose demo orders were deleted, is left alone);
+                   an unchanged dataset is detected by its fingerprint and skipped in one query
+    none           leave the data alone (indexes are still ensured)
+"""
+import hashlib
+import os
+from datetime import datetime
+from typing import List
+
+from bson import json_util
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database.mongo_db_connection import async_users_collection, async_products_collection, \
+    async_orders_collection, async_seed_state_collection
+from database.order_id_tracker import order_tracker_data, insert_orders_tracker_async, seed_orders_tracker_async
+from database.order_queries import orders_data, insert_orders_async
+from database.product_queries import products_data, insert_products_async, invalidate_product_catalog_async
+from database.user_queries import users_data, insert_users_async, invalidate_token_cache_async
+
+RESET = "reset"
+SEED_IF_EMPTY = "seed-if-empty"
+NONE = "none"
+STARTUP_MODES = (RESET, SEED_IF_EMPTY, NONE)
+
+STARTUP_MODE = os.environ.get("OMS_STARTUP_MODE", RESET)
+
+SEED_STATE_ID = "seed"
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _without_id(documents: List[dict]) -> List[dict]:
+    # insert_many adds _id to the dicts it is given; keep it out of the fingerprint and the upserts
+    return [{key: value for key, value in document.items() if key != "_id"} for document in documents]
+
+
+def dataset_fingerprint() -> str:
+    dataset = {
+        "users": _without_id(users_data),
+        "products": _without_id(products_data),
+        "orders": _without_id(orders_data),
+        "orders_tracker": order_tracker_data,
+    }
+    return hashlib.sha256(json_util.dumps(dataset, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+async def upsert_missing_async(collection, key: str, documents: List[dict]) -> int:
+    """
+    Insert the documents whose key is not in the collection yet, in one unordered bulk_write.
+    Existing documents are never modified. Returns how many were inserted.
+    """
+    operations = [UpdateOne({key: document[key]}, {"$setOnInsert": document}, upsert=True)
+                  for document in _without_id(documents)]
+    try:
+        result = await collection.bulk_write(operations, ordered=False)
+        return result.upserted_count
+    except BulkWriteError as error:
+        # Another worker seeding at the same time wins the race on the unique index; anything else is real
+        if any(write_error["code"] != DUPLICATE_KEY_ERROR for write_error in error.details["writeErrors"]):
+            raise
+        return error.details["nUpserted"]
+
+
+async def record_seed_state_async(fingerprint: str) -> None:
+    await async_seed_state_collection.update_one(
+        {"_id": SEED_STATE_ID}, {"$set": {"fingerprint": fingerprint, "seeded_at": datetime.now()}}, upsert=True)
+
+
+async def insert_seed_data_async() -> None:
+    # After a reset the collections are empty, so plain insert_many is the fastest path
+    await insert_users_async()
+    await insert_orders_tracker_async()
+    await insert_products_async()
+    await insert_orders_async()
+    await record_seed_state_async(dataset_fingerprint())
+
+
+async def is_empty_async(collection) -> bool:
+    return await collection.find_one({}, {"_id": 1}) is None
+
+
+async def seed_if_empty_async() -> bool:
+    """
+    Seed the demo documents into the collections that are still empty; populated collections are never
+    written to. Returns False if the dataset was already seeded.
+    """
+    fingerprint = dataset_fingerprint()
+    state = await async_seed_state_collection.find_one({"_id": SEED_STATE_ID}, {"fingerprint": 1})
+    if state and state["fingerprint"] == fingerprint:
+        return False
+
+    # Upserts rather than inserts, so workers starting together on an empty database don't conflict
+    if await is_empty_async(async_users_collection) \
+            and await upsert_missing_async(async_users_collection, "user_id", users_data):
+        await invalidate_token_cache_async()
+    if await is_empty_async(async_products_collection) \
+            and await upsert_missing_async(async_products_collection, "product_id", products_data):
+        await invalidate_product_catalog_async()
+    if await is_empty_async(async_orders_collection):
+        await upsert_missing_async(async_orders_collection, "order_id", orders_data)
+    await seed_orders_tracker_async()
+    await record_seed_state_async(fingerprint)
+    return True
+
+
+def startup_mode() -> str:
+    if STARTUP_MODE not in STARTUP_MODES:
+        raise ValueError(f"Invalid OMS_STARTUP_MODE {STARTUP_MODE!r}. Valid: {', '.join(STARTUP_MODES)}")
+    return STARTUP_MODE
@@ -0,0 +1,60 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from database.cache_versions import VersionWatcher
+
+USERS_CACHE_VERSION = "users"  # Bumped whenever a user's token, role or existence changes
+
+TOKEN_CACHE_MAX_SIZE = 10_000
+TOKEN_CACHE_TTL_SECONDS = 300
+# How often a worker re-reads the shared version stamp (at most one query per interval, not per request)
+TOKEN_CACHE_VERSION_CHECK_SECONDS = 5
+
+
+class TokenCache:
+    """
+    Bounded LRU/TTL cache of verified tokens: token -> principal (user_id, email, full_name, role).
+    Entries are dropped when they expire, when the cache is full, or when the shared
+    users version stamp changes (written by any worker that changes a user's identity).
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_MAX_SIZE, ttl: float = TOKEN_CACHE_TTL_SECONDS,
+                 version_check_interval: float = TOKEN_CACHE_VERSION_CHECK_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (expires_at, principal)
+        self._watcher = VersionWatcher(USERS_CACHE_VERSION, version_check_interval)
+
+    async def current_version(self):
+        if await self._watcher.poll():
+            self._entries.clear()
+        return self._watcher.version
+
+    async def get(self, token: str) -> Optional[dict]:
+        await self.current_version()
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at < time.monotonic():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return principal
+
+    def put(self, token: str, principal: dict, version) -> None:
+        # Skip results that were loaded before an invalidation landed
+        if version != self._watcher.version:
+            return
+        self._entries[token] = (time.monotonic() + self.ttl, principal)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        self._entries.clear()
+        self._watcher.reset()
+
+
+token_cache = TokenCache()
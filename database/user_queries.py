@@ -1,5 +1,9 @@
-from database.mongo_db_connection import users_collection
+from database.cache_versions import bump_version, bump_version_async
+from database.mongo_db_connection import users_collection, async_users_collection
+from database.token_cache import token_cache, USERS_CACHE_VERSION
 import base64
+from typing import Optional
+from pymongo import ReturnDocument
 import jwt
 import datetime
 
@@ -39,6 +43,7 @@ users_data = [
 
 def insert_users():
     users_collection.insert_many(users_data)
+    bump_version(USERS_CACHE_VERSION)  # Lets every app worker drop its cached tokens
 
 
 def get_users(is_admin=None):
@@ -75,3 +80,112 @@ def validate_token(token: str):
         return False, None  # Token has expired
     except jwt.InvalidTokenError:
         return False, None  # Token is invalid
+
+
+########## Async API (used by the FastAPI app) ##########
+async def insert_users_async():
+    await async_users_collection.insert_many([dict(user) for user in users_data])
+    await invalidate_token_cache_async()
+
+
+async def invalidate_token_cache_async():
+    # Call after any write that changes a user's token, role or existence
+    await bump_version_async(USERS_CACHE_VERSION)
+    token_cache.invalidate()
+
+
+async def get_user_by_email_async(email: str):
+    user = await async_users_collection.find_one({"email": email})
+    return user
+
+
+async def get_user_by_id_async(user_id: str, projection: Optional[dict] = None):
+    user = await async_users_collection.find_one({"user_id": user_id}, projection)
+    return user
+
+
+async def get_users_by_ids_async(user_ids, projection: dict):
+    # One $in query for a batch of users, keyed by user_id
+    users = async_users_collection.find({"user_id": {"$in": list(user_ids)}}, {**projection, "user_id": 1})
+    return {user["user_id"]: user async for user in users}
+
+
+async def remove_orders_from_users_async(order_ids: list):
+    await async_users_collection.update_many(
+        {"orders.order_id": {"$in": order_ids}},
+        {"$pull": {"orders": {"order_id": {"$in": order_ids}}}}
+    )
+
+
+def _add_cart_line_stage(line: dict) -> dict:
+    # Increment the quantity of an existing line for this product, or append the line
+    product_id = {"$literal": line["product_id"]}
+    return {"$set": {"cart": {"$cond": [
+        {"$in": [product_id, {"$ifNull": ["$cart.product_id", []]}]},
+        {"$map": {
+            "input": "$cart",
+            "as": "item",
+            "in": {"$cond": [
+                {"$eq": ["$$item.product_id", product_id]},
+                {"$mergeObjects": ["$$item", {"quantity": {"$add": ["$$item.quantity", line["quantity"]]}}]},
+                "$$item",
+            ]},
+        }},
+        {"$concatArrays": [{"$ifNull": ["$cart", []]}, [{"$literal": line}]]},
+    ]}}}
+
+
+async def add_items_to_cart_async(user_id: str, lines: list):
+    """
+    Merge validated cart lines into the user's cart in one atomic update pipeline.
+    Concurrent calls for the same user never lose each other's increments.
+    Returns the updated cart, or None if the user does not exist.
+    """
+    user = await async_users_collection.find_one_and_update(
+        {"user_id": user_id},
+        [_add_cart_line_stage(line) for line in lines],
+        projection={"_id": 0, "cart": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return user.get("cart", []) if user else None
+
+
+# Fields every authenticated route needs; routes ask for extras (e.g. "cart") explicitly
+PRINCIPAL_FIELDS = ("user_id", "email", "full_name", "role")
+
+
+async def validate_token_async(token: str, extra_fields=()):
+    """
+    Verify the token and return (is_valid, user).
+    The verified principal comes from the token cache and only the extra fields
+    are read from MongoDB, so plain authentication costs no query.
+    """
+    version = await token_cache.current_version()
+    principal = await token_cache.get(token)
+    if principal is not None:
+        if not extra_fields:
+            return True, principal
+        extras = await async_users_collection.find_one(
+            {"user_id": principal["user_id"]}, {"_id": 0, **{field: 1 for field in extra_fields}}
+        )
+        if extras is None:
+            return False, None  # User was removed since the token was cached
+        return True, {**principal, **extras}
+    try:
+        # Decode the token
+        decoded_payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        user_id = decoded_payload.get("user_id")
+        if not user_id:
+            return False, None  # Invalid token, missing user_id
+        # Fetch the user once, limited to the fields the caller needs
+        projection = {"_id": 0, "token": 1, **{field: 1 for field in (*PRINCIPAL_FIELDS, *extra_fields)}}
+        user = await async_users_collection.find_one({"user_id": user_id}, projection)
+        if user and user.get("token") == token:
+            token_cache.put(token, {field: user[field] for field in PRINCIPAL_FIELDS if field in user}, version)
+            return True, user  # Token is valid, return user data
+        return False, None  # User not found or token mismatch
+
+    except jwt.ExpiredSignatureError:
+        return False, None  # Token has expired
+    except jwt.InvalidTokenError:
+        return False, None  # Token is invalid
@@ -1,42 +1,84 @@
+import asyncio
 from datetime import datetime, timezone, timedelta
 from contextlib import asynccontextmanager
 import random
-from typing import Optional, List, Dict
-from fastapi.responses import HTMLResponse
+from typing import Annotated, Optional, List, Dict
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse, FileResponse
 from bson import ObjectId
 from fastapi import FastAPI, HTTPException, Header, Depends, Query
 from pycparser.ply.yacc import Production
 from pydantic import BaseModel
 import base64
 import jwt
-from pymongo import UpdateOne
 
-from database.mongo_db_connection import clean_collections, products_collection, users_collection
-from database.order_id_tracker import insert_orders_tracker, update_last_order_id, get_last_order_id
-from database.user_queries import insert_users, get_user_by_email, \
-    validate_token, get_user_by_id
-from database.product_queries import insert_products, update_product_stock
-from database.order_queries import insert_orders, create_order as db_create_order, get_orders_by_status, \
-    get_order_by_id, get_all_orders, update_order_status_in_db, delete_all_orders, delete_order_by_id_admin
+from database.mongo_db_connection import clean_collections_async, async_users_collection as users_collection
+from database.indexes import ensure_indexes_async
+from database.seeding import startup_mode, insert_seed_data_async, seed_if_empty_async, RESET, SEED_IF_EMPTY
+from database.inventory import aggregate_quantities, decrement_stock_async as decrement_stock, \
+    take_stock_for_shipment_async as take_stock_for_shipment, \
+    return_stock_for_shipment_async as return_stock_for_shipment
+from database.product_catalog import product_catalog
+from database.order_id_tracker import update_last_order_id_async
+from database.user_queries import get_user_by_email_async as get_user_by_email, \
+    validate_token_async as validate_token, get_user_by_id_async as get_user_by_id, \
+    add_items_to_cart_async as add_items_to_cart, get_users_by_ids_async as get_users_by_ids, \
+    remove_orders_from_users_async as remove_orders_from_users
+from database.order_queries import create_order_async as db_create_order, \
+    get_order_by_id_async as get_order_by_id, get_user_order_async as get_user_order, \
+    transition_order_status_async as transition_order_status, \
+    bulk_transition_order_status_async as bulk_transition_order_status, \
+    revert_order_status_async as revert_order_status, \
+    delete_order_by_id_admin_async as delete_order_by_id_admin, \
+    iter_order_batches_async as iter_order_batches, delete_orders_by_ids_async as delete_orders_by_ids, \
+    get_orders_page_async as get_orders_page, build_orders_by_status_query, DEFAULT_ORDER_PAGE_SIZE, \
+    MAX_ORDER_PAGE_SIZE, stream_orders_async as stream_orders, decode_order_cursor, DEFAULT_STREAM_BATCH_SIZE
+from notifications.dispatcher import notification_dispatcher, notify, notify_many
+from utils.json_stream import NDJSON_MEDIA_TYPE, stream_json_array, stream_ndjson
+from utils.startup_timings import StartupTimings
+from observability.metrics import render_metrics, PROMETHEUS_MEDIA_TYPE
+from observability.middleware import RequestMetricsMiddleware
+from observability.query_budget import QueryBudgetMiddleware, query_budget
+from observability.slow_queries import slow_query_recorder
+from observability.profiling import ProfilingMiddleware, request_profiler
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup logic
-    print("Clearing the database.")
-    clean_collections()
-    print("Inserting initial data...")
-    insert_users()
-    insert_orders_tracker()
-    insert_products()
-    insert_orders()
-    print("All data inserted successfully!")
+    mode = startup_mode()
+    timings = StartupTimings()
+    if mode == RESET:
+        print("Clearing the database.")
+        with timings.phase("drop"):
+            await clean_collections_async()
+    print("Creating indexes...")
+    with timings.phase("indexes"):
+        await ensure_indexes_async()
+    if mode == RESET:
+        print("Inserting initial data...")
+        with timings.phase("seed"):
+            await insert_seed_data_async()
+        print("All data inserted successfully!")
+    elif mode == SEED_IF_EMPTY:
+        with timings.phase("seed"):
+            seeded = await seed_if_empty_async()
+        print("Missing initial data inserted." if seeded else "Initial data unchanged, seeding skipped.")
+    with timings.phase("dispatcher"):
+        notification_dispatcher.start()
+    app.state.startup = {"mode": mode, **timings.report()}
+    print(timings.summary())
     yield
     # Shutdown logic
     print("Application is shutting down")
+    await notification_dispatcher.stop()
 
 
 app = FastAPI(lifespan=lifespan)
+# Added last = outermost: the metrics middleware sets the RequestContext the budget check reads.
+# Budgets (@query_budget) cover auth and cache refreshes (token / catalog version polls, at most one each).
+app.add_middleware(QueryBudgetMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)  # Outermost, so a profile covers the whole request
 
 
 class OrderItem(BaseModel):
@@ -69,6 +111,12 @@ class UpdateOrderStatusRequest(BaseModel):
     new_status: str
 
 
+class BulkUpdateOrderStatusRequest(BaseModel):
+    new_status: str
+    order_ids: Optional[List[int]] = None  # Explicit orders, or when omitted:
+    created_before: Optional[datetime] = None  # every order in the previous status (optionally created before this)
+
+
 # Define valid status transitions
 VALID_ORDER_STATUSES: Dict[str, str] = {
     "Pending": "Processing",
@@ -76,6 +124,14 @@ VALID_ORDER_STATUSES: Dict[str, str] = {
     "Shipped": "Delivered",
     "Delivered": None  # No further transitions allowed
 }
+# The status an order must be in to move to a given status (enforced in the update filter)
+PREVIOUS_ORDER_STATUS: Dict[str, str] = {new: current for current, new in VALID_ORDER_STATUSES.items() if new}
+
+STATUS_EMAIL_TEMPLATES: Dict[str, str] = {
+    "Processing": "Dear  {full_name}, your order #{order_id} is now being processed.",
+    "Shipped": "Dear  {full_name}, your order #{order_id} has been shipped.",
+    "Delivered": "Dear  {full_name}, your order #{order_id} has been delivered.",
+}
 
 ######### Credit Card #########
 class CreditCard(BaseModel):
@@ -119,6 +175,13 @@ async def get_card(name: str = Query(..., description="Name of the card holder")
 def get_current_timestamp():
     return datetime.now()
 
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus scrape target: per-route request counts/latency and the MongoDB commands each route issued
+    return Response(content=render_metrics(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
 ##### Order Placement Flow #####
 @app.get("/")
 async def home():
@@ -126,9 +189,10 @@ async def home():
 
 
 @app.post("/login")
+@query_budget(1)
 async def login(credentials: LoginRequest):
     # Fetch the user from MongoDB by email
-    user = get_user_by_email(credentials.email)  # Implement this function to fetch user by email
+    user = await get_user_by_email(credentials.email)  # Implement this function to fetch user by email
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     # Encode the provided password to base64
@@ -151,6 +215,39 @@ def get_token_from_header(authorization: str = Header(...)) -> str:
     return authorization[7:]  # Remove 'Bearer ' part
 
 
+class UserLoader:
+    """
+    Request-scoped authenticated principal.
+    Decodes the token, loads the user once with only the requested fields and enforces the role.
+    """
+
+    def __init__(self, *extra_fields: str, admin: bool = False):
+        self.extra_fields = extra_fields
+        self.admin = admin
+
+    async def __call__(self, token: str = Depends(get_token_from_header)) -> dict:
+        is_valid, user = await validate_token(token, self.extra_fields)
+        if not is_valid:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        if self.admin and not user["role"]["is_admin"]:
+            raise HTTPException(status_code=403, detail="Unauthorized")
+        return user
+
+
+CurrentUser = Annotated[dict, Depends(UserLoader())]
+CartUser = Annotated[dict, Depends(UserLoader("cart"))]
+AdminUser = Annotated[dict, Depends(UserLoader(admin=True))]
+
+
+async def is_admin_token(token: str) -> bool:
+    # Who may ask for a request profile (X-Profile: 1 / ?profile=1)
+    is_valid, user = await validate_token(token, ())
+    return is_valid and user["role"]["is_admin"]
+
+
+request_profiler.authorize = is_admin_token
+
+
 def serialize_product(product: dict) -> dict:
     # Convert _id from ObjectId to string and return only the necessary fields
     return {
@@ -161,30 +258,17 @@ def serialize_product(product: dict) -> dict:
 
 
 @app.get("/products")
-async def get_products(token: str = Depends(get_token_from_header)):
-    # Validate the token
-    is_valid, user = validate_token(token)
-
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    # Fetch products if token is valid
-    products_cursor = products_collection.find({}, {"_id": 0})  # Exclude _id field from the query
-    products = [serialize_product(product) for product in products_cursor]
-
-    return {"products": products}
+@query_budget(4)
+async def get_products(user: CurrentUser):
+    # Served from the in-memory catalog, serialized once per catalog version
+    return Response(content=await product_catalog.products_json(), media_type="application/json")
 
 
 @app.get("/product/{product_id}")
-async def user_get_product_by_id(product_id: str, token: str = Depends(get_token_from_header)):
-    # Validate the token
-    is_valid, user = validate_token(token)
-
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
+@query_budget(4)
+async def user_get_product_by_id(product_id: str, user: CurrentUser):
     # Fetch the product by its product_id
-    product = products_collection.find_one({"product_id": product_id}, {"_id": 0})
+    product = await product_catalog.get(product_id)
 
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -196,50 +280,31 @@ async def user_get_product_by_id(product_id: str, token: str = Depends(get_token
 
 
 @app.get("/cart")
-async def get_cart(token: str = Depends(get_token_from_header)):
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    user_data = get_user_by_email(user["email"])
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    return {"cart": user_data.get("cart", [])}
-
-
-from fastapi import HTTPException
-from typing import List
+@query_budget(2)
+async def get_cart(user: CartUser):
+    return {"cart": user.get("cart", [])}
 
 
 @app.put("/cart")
-async def update_cart(cart_items: List[CartItem], token: str = Depends(get_token_from_header)):
+@query_budget(5)
+async def update_cart(cart_items: List[CartItem], user: CurrentUser):
     # Check if cart_items is empty
     if not cart_items:
         raise HTTPException(status_code=400, detail="Cart items list cannot be empty")
 
-    # Validate the token
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    # Resolve every requested product in one lookup
+    products = await product_catalog.get_many({cart_item.product_id for cart_item in cart_items})
 
-    # Get the user data from the database
-    user_data = get_user_by_email(user["email"])
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    cart = user_data.get("cart", [])
+    # Validated lines keyed by product_id; repeated products are summed
+    lines = {}
 
-    # Iterate through each cart item for validation and updating
+    # Iterate through each cart item for validation
     for cart_item in cart_items:
         # Check if the product_id is valid and get product data
-        product_data = products_collection.find_one({"product_id": cart_item.product_id})
+        product_data = products.get(cart_item.product_id)
         if not product_data:
             raise HTTPException(status_code=400, detail=f"Invalid product_id: {cart_item.product_id}")
 
-        # Extract the price from the product data
-        product_price = product_data["price"]
-
         # Validate product name (optional, depending on how you're handling this)
         if product_data["name"] != cart_item.name:
             raise HTTPException(status_code=400, detail=f"Product name mismatch: {cart_item.name}")
@@ -252,108 +317,69 @@ async def update_cart(cart_items: List[CartItem], token: str = Depends(get_token
             raise HTTPException(status_code=400,
                                 detail=f"Quantity for product {cart_item.product_id} must be between 1 and 10.")
 
-        # Update the cart with the new quantity or add the item if it doesn't exist
-        updated = False
-        for item in cart:
-            if item["product_id"] == cart_item.product_id:
-                item["quantity"] += cart_item.quantity  # Increment the quantity instead of replacing
-                updated = True
-                break
-
-        # If the product is not already in the cart, append it to the cart
-        if not updated:
-            cart.append({
+        if cart_item.product_id in lines:
+            lines[cart_item.product_id]["quantity"] += cart_item.quantity
+        else:
+            lines[cart_item.product_id] = {
                 "product_id": cart_item.product_id,
                 "name": cart_item.name,
                 "quantity": cart_item.quantity,
-                "price": product_price  # Add the fetched price here
-            })
+                "price": product_data["price"]  # Add the catalog price here
+            }
 
-    # Update the user's cart in the database
-    users_collection.update_one({"user_id": user["user_id"]}, {"$set": {"cart": cart}})
+    # Increment existing lines / append new ones atomically on the server, and get the cart back
+    cart = await add_items_to_cart(user["user_id"], list(lines.values()))
+    if cart is None:
+        raise HTTPException(status_code=404, detail="User not found")
 
     # Return a success message along with the updated cart
     return {"message": "Cart updated successfully", "cart": cart}
 
 
 @app.delete("/cart")
-async def clear_cart(token: str = Depends(get_token_from_header)):
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    user_data = get_user_by_email(user["email"])
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-
+@query_budget(3)
+async def clear_cart(user: CurrentUser):
     # Empty the cart by setting it to an empty list
-    users_collection.update_one({"user_id": user["user_id"]}, {"$set": {"cart": []}})
+    await users_collection.update_one({"user_id": user["user_id"]}, {"$set": {"cart": []}})
 
     return {"message": "All products removed from cart", "cart": []}
 
 
+# No @query_budget: stock is reserved with one conditional update per distinct product (a bulk_write
+# cannot report which lines matched, so shortages could not be told apart), so the command count grows
+# with the cart. Every other step of checkout is a fixed number of commands.
 @app.post("/checkout")
-async def checkout(credit_card: CreditCard, token: str = Depends(get_token_from_header)):
-     # Validate the token
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
+async def checkout(credit_card: CreditCard, user: CartUser):
     # Validate card expiry date
     current_date = datetime.now()
     expiry_date = datetime.strptime(credit_card.expiry_date, "%m/%y")
     if expiry_date < current_date:
-        return {
-            f"Email sent to {user['email']}": f"Dear {user['full_name']}, your card has expired. Please use a valid card."
-        }
+        return await email_response(user['email'], f"Dear {user['full_name']}, your card has expired. Please use a valid card.")
 
     # Get user's cart
-    user_data = get_user_by_email(user["email"])
-    if not user_data or "cart" not in user_data or not user_data["cart"]:
+    if not user.get("cart"):
         raise HTTPException(status_code=400, detail="Cart is empty")
 
-    cart_items = user_data["cart"]
+    cart_items = user["cart"]
 
     # Mock payment system
     payment_success = random.choice([True, False])
     if not payment_success:
-        return {
-            f"Email sent to {user['email']}": f"Dear {user['full_name']}, your card was declined. Please check with your bank if you have a balance."
-        }
-
-    # Check stock availability and calculate total price
-    out_of_stock_items = []
-    total_price = 0
-    update_operations = []
-
-    for item in cart_items:
-        product = products_collection.find_one({"product_id": item["product_id"]})
-        if not product:
-            continue  # Product not found, assume it's unavailable
-
-        if item["quantity"] > product["stock"]:
-            out_of_stock_items.append(product["name"])
-        else:
-            total_price += product["price"] * item["quantity"]
-            # Prepare the stock decrement operation
-            update_operations.append(
-                UpdateOne(
-                    {"product_id": item["product_id"]},
-                    {"$inc": {"stock": -item["quantity"]}}
-                )
-            )
+        return await email_response(user['email'], f"Dear {user['full_name']}, your card was declined. Please check with your bank if you have a balance.")
 
-    if out_of_stock_items:
-        return {
-            f"Email sent to {user['email']}": f"Dear {user['full_name']}, sorry - the following items are out of stock: {', '.join(out_of_stock_items)}. Your card will be refunded."
-        }
+    # Price and name come from the catalog in one batch; products no longer in it are skipped
+    products = await product_catalog.get_many({item["product_id"] for item in cart_items})
+    quantities = aggregate_quantities([item for item in cart_items if item["product_id"] in products])
+    total_price = sum(products[product_id]["price"] * quantity for product_id, quantity in quantities.items())
 
-    # Apply stock updates
-    if update_operations:
-        products_collection.bulk_write(update_operations)
+    # Check stock availability and reserve it with concurrent conditional decrements, all-or-nothing
+    shortages = await decrement_stock(quantities)
+    if shortages:
+        out_of_stock_items = [products[shortage["product_id"]]["name"] for shortage in shortages]
+        return await email_response(user['email'], f"Dear {user['full_name']}, sorry - the following items are out of stock: {', '.join(out_of_stock_items)}. Your card will be refunded.")
 
     # Get the incremented order_id
-    order_id = update_last_order_id()  # Ensure this is properly incremented
+    order_id = await update_last_order_id_async()  # Ensure this is properly incremented
 
     # Create the order
     order_data = {
@@ -366,130 +392,135 @@ async def checkout(credit_card: CreditCard, token: str = Depends(get_token_from_
         "order_id": order_id,
     }
 
-    db_create_order(order_data)
+    await db_create_order(order_data)
 
-    # Clear user's cart after successful order placement
-    users_collection.update_one({"user_id": user["user_id"]}, {"$set": {"cart": []}})
-    users_collection.update_one(
+    # Clear user's cart and record the order in one update
+    await users_collection.update_one(
         {"user_id": user["user_id"]},
-        {"$push": {"orders": {"order_id": order_id, "total_price": total_price}}}
+        {"$set": {"cart": []}, "$push": {"orders": {
+            "$each": [{"order_id": order_id, "total_price": total_price}],
+            "$slice": -RECENT_ORDERS_ON_USER,
+        }}}
     )
 
-    return {
-        f"Email sent to {user['email']}": f"Confirmation Email: Dear {user['full_name']}, your order is pending. Order details: {order_data['items']}, Total price: ${total_price}. We'll keep you posted on the progress.",
-        "order_id": order_id  # Return the correct order_id
-    }
+    return await email_response(
+        user['email'],
+        f"Confirmation Email: Dear {user['full_name']}, your order is pending. Order details: {order_data['items']}, Total price: ${total_price}. We'll keep you posted on the progress.",
+        order_id=order_id  # Return the correct order_id
+    )
 
 
-@app.get("/orders")
-async def get_orders(token: str = Depends(get_token_from_header)):
-    # Validate the token
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    # Get user's data
-    user_data = get_user_by_email(user["email"])
-    if not user_data or "orders" not in user_data or not user_data["orders"]:
-        raise HTTPException(status_code=400, detail="No orders found")
+# Only the most recent order summaries are kept on the user document; the full history is
+# read from the orders collection (user_id_created_at index)
+RECENT_ORDERS_ON_USER = 50
+ORDER_SUMMARY_PROJECTION = {"_id": 0, "order_id": 1, "total_price": 1, "created_at": 1}
+ORDER_ITEMS_PROJECTION = {**ORDER_SUMMARY_PROJECTION, "items": 1, "status": 1}
 
-    # Retrieve the orders
-    orders = user_data["orders"]
-    order_list = [{"order_id": order["order_id"], "total_price": order["total_price"]} for order in orders]
 
-    return {"orders": order_list}
+def order_history_projection(expand: Optional[str]) -> dict:
+    if expand is None:
+        return ORDER_SUMMARY_PROJECTION
+    if expand == "items":
+        return ORDER_ITEMS_PROJECTION
+    raise HTTPException(status_code=400, detail="Invalid expand value. Supported: items")
 
 
-@app.get("/orders/{order_id}")
-async def user_get_order_by_id(order_id: str, token: str = Depends(get_token_from_header)):
-    # Validate the token
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    # Get user data
-    user_data = get_user_by_email(user["email"])
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
+def order_summary(order: dict, expand: Optional[str]) -> dict:
+    summary = {"order_id": order["order_id"], "total_price": order["total_price"]}
+    if expand == "items":
+        summary.update(status=order["status"], created_at=order["created_at"], items=order["items"])
+    return summary
 
-    # Ensure "orders" exists and is a list
-    if not isinstance(user_data.get("orders"), list) or not user_data["orders"]:
+
+@app.get("/orders")
+@query_budget(4)
+async def get_orders(
+        user: CurrentUser,
+        limit: int = Query(DEFAULT_ORDER_PAGE_SIZE, ge=1, le=MAX_ORDER_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        expand: Optional[str] = Query(None, description="items: include status, created_at and line items")
+):
+    projection = order_history_projection(expand)
+    try:
+        # Oldest first, one page at a time
+        orders, next_cursor = await get_orders_page({"user_id": user["user_id"]}, limit, cursor, projection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not orders and not cursor:
         raise HTTPException(status_code=400, detail="No orders found")
 
+    return {"orders": [order_summary(order, expand) for order in orders], "next_cursor": next_cursor}
+
+
+@app.get("/orders/{order_id}")
+@query_budget(3)
+async def user_get_order_by_id(
+        order_id: str,
+        user: CurrentUser,
+        expand: Optional[str] = Query(None, description="items: include status, created_at and line items")
+):
+    projection = order_history_projection(expand)
+
     # Convert order_id to int
     try:
         order_id = int(order_id)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid order ID format")
 
-    # Find the order
-    order = next((order for order in user_data["orders"] if order.get("order_id") == order_id), None)
+    # Find the order among the user's own orders
+    order = await get_user_order(user["user_id"], order_id, projection)
 
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
     # Return the order details
-    return {
-        "order_id": order["order_id"],
-        "total_price": order["total_price"]
-    }
+    return order_summary(order, expand)
 
 
 ####### Order Processing Flow (Admin Panel) ######
 @app.get("/panel")
-async def get_panel(token: str = Depends(get_token_from_header)):
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    # Check if the user is an admin
-    if not user["role"]["is_admin"]:
-        raise HTTPException(status_code=403, detail="Unauthorized")
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    # Check if the user is an admin
-
+@query_budget(2)
+async def get_panel(user: AdminUser):
     return {"message": "Welcome to the admin panel OMS Admin Panel, please take care of the pending orders!"}
 
 
-@app.get("/panel/orders")
-async def list_pending_orders(token: str = Depends(get_token_from_header)):
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    user_data = get_user_by_email(user["email"])
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
+def stream_orders_response(query: dict, cursor: Optional[str], batch_size: int, accept: Optional[str]):
+    # Every matching order (from cursor on) streamed from the MongoDB cursor: NDJSON if asked for, else a JSON array
+    if cursor:
+        decode_order_cursor(cursor)  # Fail with 400 before the response starts
+    orders = stream_orders(query, batch_size, cursor)
+    if accept and NDJSON_MEDIA_TYPE in accept:
+        return StreamingResponse(stream_ndjson(orders), media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(stream_json_array(orders), media_type="application/json")
 
-    # Check if the user is an admin
-    if not user_data["role"]["is_admin"]:
-        raise HTTPException(status_code=403, detail="Unauthorized")
 
-    # Fetch pending orders
-    orders = get_all_orders()
-    if not orders:
-        return {"orders": [], "message": "No orders found"}
-    return {"orders": orders}
+@app.get("/panel/orders")
+@query_budget(4)
+async def list_pending_orders(
+        user: AdminUser,
+        limit: int = Query(DEFAULT_ORDER_PAGE_SIZE, ge=1, le=MAX_ORDER_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        stream: bool = Query(False, description="Stream all orders instead of returning one page"),
+        batch_size: int = Query(DEFAULT_STREAM_BATCH_SIZE, ge=1, le=MAX_ORDER_PAGE_SIZE),
+        accept: Optional[str] = Header(None)
+):
+    try:
+        if stream or (accept and NDJSON_MEDIA_TYPE in accept):
+            return stream_orders_response({}, cursor, batch_size, accept)
+        # Fetch one page of orders, oldest first
+        orders, next_cursor = await get_orders_page({}, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not orders and not cursor:
+        return {"orders": [], "next_cursor": None, "message": "No orders found"}
+    return {"orders": orders, "next_cursor": next_cursor}
 
 
 @app.get("/panel/orders/{order_id}")
-async def admin_get_order_by_id(order_id: int, token: str = Depends(get_token_from_header)):
-    # Validate the token
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    # Get user's data
-    user_data = get_user_by_email(user["email"])
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Check if the user is an admin
-    if not user_data["role"]["is_admin"]:
-        raise HTTPException(status_code=403, detail="Unauthorized")
-
+@query_budget(3)
+async def admin_get_order_by_id(order_id: int, user: AdminUser):
     # Find the order by order_id
-    order = get_order_by_id(order_id)
+    order = await get_order_by_id(order_id)
 
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -505,23 +536,10 @@ async def admin_get_order_by_id(order_id: int, token: str = Depends(get_token_fr
 
 
 @app.delete("/panel/orders/{order_id}")
-async def admin_delete_order_by_id(order_id: int, token: str = Depends(get_token_from_header)):
-    # Validate the token
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    # Get user's data
-    user_data = get_user_by_email(user["email"])
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Check if the user is an admin
-    if not user_data["role"]["is_admin"]:
-        raise HTTPException(status_code=403, detail="Unauthorized")
-
+@query_budget(7)
+async def admin_delete_order_by_id(order_id: int, user: AdminUser):
     # Get the order data
-    order_data = get_order_by_id(order_id)
+    order_data = await get_order_by_id(order_id)
 
     if not order_data or 'error' in order_data:
         raise HTTPException(status_code=404, detail="Order not found or deleted already")
@@ -531,118 +549,145 @@ async def admin_delete_order_by_id(order_id: int, token: str = Depends(get_token
         raise HTTPException(status_code=400, detail="Only Pending orders can be deleted")
 
     # Delete the order from the database
-    delete_result = delete_order_by_id_admin(order_id)
+    delete_result = await delete_order_by_id_admin(order_id)
 
     # Check if delete operation was successful
     if not delete_result:
         raise HTTPException(status_code=404, detail="Order not found or already deleted")
 
     # Remove the order from the user document
-    users_collection.update_one(
+    await users_collection.update_one(
         {"orders.order_id": order_id},  # Find the user who has this order
         {"$pull": {"orders": {"order_id": order_id}}}  # Remove only this order
     )
 
     # Send refund email message
-    refund_message = (
-        f"Dear {get_user_by_id(order_data['user_id'])['full_name']},\n\n"
-        f"Your order {order_id} has been deleted as requested.\n"
-        f"The total amount of ${order_data['total_price']} will be refunded.\n\n"
-        f"Thank you for shopping with us."
-    )
-    return {"message": f"Order {order_id} deleted successfully", "email": f"{refund_message}"}
+    customer = await get_user_by_id(order_data['user_id'])
+    message = refund_message(customer['full_name'], order_id, order_data['total_price'])
+    await notify(customer['email'], message, order_id)
+    return {"message": f"Order {order_id} deleted successfully", "email": f"{message}"}
+
+
+# Orders handled per round trip by DELETE /panel/orders
+DELETE_ORDERS_BATCH_SIZE = 1000
 
 
 @app.delete("/panel/orders")
-async def admin_delete_all_orders(token: str = Depends(get_token_from_header)):
-    # Validate the token
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    # Get user's data
-    user_data = get_user_by_email(user["email"])
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
+async def admin_delete_all_orders(user: AdminUser):
+    deleted_count = 0
+    notifications_queued = 0
+    order_projection = {"_id": 1, "order_id": 1, "user_id": 1, "total_price": 1}
+    # Walk the orders in batches so memory stays bounded, whatever the number of orders
+    async for orders in iter_order_batches(DELETE_ORDERS_BATCH_SIZE, order_projection):
+        # Resolve the batch's distinct users with one query
+        users = await get_users_by_ids({order["user_id"] for order in orders}, {"_id": 0, "full_name": 1, "email": 1})
+
+        deleted_count += await delete_orders_by_ids([order["_id"] for order in orders])
+        # Remove orders from user documents
+        await remove_orders_from_users([order["order_id"] for order in orders])
+
+        # Refund emails go to the outbox in one insert and are delivered in the background
+        notifications_queued += await notify_many(
+            (users[order["user_id"]]["email"],
+             refund_message(users[order["user_id"]]["full_name"], order["order_id"], order["total_price"]),
+             order["order_id"])
+            for order in orders if order["user_id"] in users
+        )
 
-    # Check if the user is an admin
-    if not user_data["role"]["is_admin"]:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+    if not deleted_count:
+        return {"message": "No orders found to delete", "deleted": 0, "notifications_queued": 0}
+    return {
+        "message": f"All {deleted_count} orders deleted successfully",
+        "deleted": deleted_count,
+        "notifications_queued": notifications_queued,
+    }
 
-    # Fetch all orders
-    orders = get_all_orders()
-    if not orders:
-        return {"message": "No orders found to delete"}
 
-    # Delete all orders
-    delete_result = delete_all_orders()  # Function to remove all orders from the database
+@app.get("/panel/notifications/stats")
+@query_budget(3)
+async def notification_stats(user: AdminUser):
+    # Outbox queue depth and delivery latency of this worker's dispatcher
+    return await notification_dispatcher.stats()
 
-    # Remove orders from user documents
-    users_collection.update_many({}, {"$set": {"orders": []}})
 
-    if not delete_result:
-        raise HTTPException(status_code=500, detail="Failed to delete orders")
-    email = ''
-    # Send refund emails
-    for order in orders:
-        refund_message = (
-            f"Dear {get_user_by_id(order['user_id'])['full_name']},\n\n"
-            f"Your order {order['order_id']} has been deleted as requested.\n"
-            f"The total amount of ${order['total_price']} will be refunded.\n\n"
-            f"Thank you for shopping with us."
-        )
-        email += send_email(get_user_by_id(order['user_id'])["email"], refund_message)
+@app.get("/panel/diagnostics/slow-queries")
+@query_budget(2)
+async def slow_queries(user: AdminUser, limit: int = Query(50, ge=1, le=200)):
+    # Slowest query shapes (with their latest explain plan) and the most recent slow commands of this worker
+    return slow_query_recorder.report(limit)
+
+
+@app.get("/panel/profiles")
+@query_budget(2)
+async def list_profiles(
+        user: AdminUser,
+        limit: int = Query(50, ge=1, le=500),
+        route: Optional[str] = Query(None, description="Route template, e.g. /checkout"),
+        sort: str = Query("recent", pattern="^(recent|duration)$")
+):
+    # Recent request profiles of every worker, from the profile directory's index
+    profiles = await asyncio.to_thread(request_profiler.recent, limit, route, sort)
+    return {"sample_rate": request_profiler.sample_rate, "profiles": profiles}
 
-    return {"message": f"All {len(orders)} orders deleted successfully", "email": f"{email}"}
+
+@app.get("/panel/profiles/{name}")
+@query_budget(2)
+async def get_profile(name: str, user: AdminUser):
+    # Collapsed stacks, ready for flamegraph.pl / speedscope
+    path = request_profiler.path_of(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+
+@app.put("/panel/profiles/sampling")
+@query_budget(2)
+async def set_profile_sampling(user: AdminUser, rate: float = Query(..., ge=0, le=1)):
+    # Fraction of all requests this worker profiles, until restart
+    request_profiler.sample_rate = rate
+    return {"sample_rate": rate}
+
+
+@app.get("/panel/startup")
+@query_budget(2)
+async def startup_report(user: AdminUser):
+    # Startup mode and how long each startup phase of this worker took
+    return app.state.startup
 
 
 @app.get("/panel/orders/status/{status}")
-async def list_orders_by_status(status: str, token: str = Depends(get_token_from_header)):
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    user_data = get_user_by_email(user["email"])
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-    # Check if the user is an admin
-    if not user_data["role"]["is_admin"]:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+@query_budget(4)
+async def list_orders_by_status(
+        status: str,
+        user: AdminUser,
+        start_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
+        end_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
+        limit: int = Query(DEFAULT_ORDER_PAGE_SIZE, ge=1, le=MAX_ORDER_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        stream: bool = Query(False, description="Stream all matching orders instead of returning one page"),
+        batch_size: int = Query(DEFAULT_STREAM_BATCH_SIZE, ge=1, le=MAX_ORDER_PAGE_SIZE),
+        accept: Optional[str] = Header(None)
+):
     # Fetch orders by status
     if status.capitalize() not in VALID_ORDER_STATUSES:
         raise HTTPException(status_code=404, detail="Status not found")
-    orders = get_orders_by_status(status.capitalize())
-    return {"orders": orders}
-
-
-@app.put("/panel/orders/update-status")
-async def update_order_status(
-        request: UpdateOrderStatusRequest, token: str = Depends(get_token_from_header)
-):
-    # Token validation (ensure this function is defined elsewhere)
-    is_valid, user = validate_token(token)
-    if not is_valid:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    # User validation (ensure this function is defined elsewhere)
-    user_data = get_user_by_email(user["email"])
-    if not user_data:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Ensure the user is an admin
-    if not user_data["role"]["is_admin"]:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+    try:
+        query = build_orders_by_status_query(status.capitalize(), start_date, end_date)
+        if stream or (accept and NDJSON_MEDIA_TYPE in accept):
+            return stream_orders_response(query, cursor, batch_size, accept)
+        orders, next_cursor = await get_orders_page(query, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"orders": orders, "next_cursor": next_cursor}
 
-    # Fetch order by ID
-    order = get_order_by_id(request.order_id)
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
 
+def check_status_transition(order: dict, new_status: str) -> None:
+    # Raise the HTTP error explaining why order cannot move to new_status
     # Ensure the 'status' field is present
     if "status" not in order:
         raise HTTPException(status_code=400, detail="Order status is missing")
 
     current_status = order["status"]
-    new_status = request.new_status
 
     # Validate status transition
     if current_status not in VALID_ORDER_STATUSES:
@@ -659,47 +704,166 @@ async def update_order_status(
                    f"Valid next status is: {expected_next_status}."
         )
 
-    # Update the order status in DB
-    updated_order = update_order_status_in_db(request.order_id, new_status)
-    if not updated_order:
-        raise HTTPException(status_code=404, detail="Order not found")
 
-    # Send email notification
-    status_messages = {
-        "Processing": f"Dear  {get_user_by_id(updated_order['user_id'])['full_name']}, your order #{request.order_id} is now being processed.",
-        "Shipped": f"Dear  {get_user_by_id(updated_order['user_id'])['full_name']}, your order #{request.order_id} has been shipped.",
-        "Delivered": f"Dear  {get_user_by_id(updated_order['user_id'])['full_name']}, your order #{request.order_id} has been delivered.",
-    }
-    # Update product stock if status changes to "Shipped"
+# No @query_budget: shipping takes stock with one conditional update per distinct product in the order,
+# so the command count grows with the order (see POST /checkout).
+@app.put("/panel/orders/update-status")
+async def update_order_status(request: UpdateOrderStatusRequest, user: AdminUser):
+    new_status = request.new_status
+    previous_status = PREVIOUS_ORDER_STATUS.get(new_status)
+
+    # Shipping takes the stock before the transition, so an order is never seen as Shipped without it:
+    # all lines in one batch, or none of them
+    shipping_order = None
     if new_status == "Shipped":
-        for item in updated_order["items"]:
-            product = get_product_by_id(item["product_id"])
-            if product:
-                new_stock = product["stock"] - item["quantity"]
-                if new_stock < 0:
-                    raise HTTPException(
-                        status_code=400, detail=f"Not enough stock for product: {product['name']}"
-                    )
-                update_product_stock(item["product_id"], new_stock)
+        order = await get_order_by_id(request.order_id)
+        if order and order.get("status") == previous_status:
+            shortages = await take_stock_for_shipment([order])
+            if shortages:
+                return JSONResponse(status_code=400, content={
+                    "detail": f"Not enough stock for product: {', '.join(s['name'] or s['product_id'] for s in shortages)}",
+                    "shortages": shortages,
+                })
+            shipping_order = order
+
+    # Compare-and-set in one round trip: the allowed transition is part of the update filter
+    updated_order = None
+    if previous_status:
+        updated_order = await transition_order_status(request.order_id, previous_status, new_status)
+
+    if not updated_order:
+        if shipping_order:
+            await return_stock_for_shipment([shipping_order])  # Another update got there first
+        # Only on failure: fetch the order to explain why
+        order = await get_order_by_id(request.order_id)
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        check_status_transition(order, new_status)
+        # The transition was valid but another update got there first
+        raise HTTPException(status_code=409, detail=f"Order {request.order_id} status changed concurrently, please retry.")
+
+    customer = await get_user_by_id(updated_order['user_id'], {"_id": 0, "full_name": 1, "email": 1})
     return {
         "message": f"Order {request.order_id} status updated to {new_status} ",
-        "email": f"{send_email(get_user_by_id(updated_order['user_id'])['email'], status_messages[new_status])}",
+        "email": await notify(
+            customer['email'],
+            STATUS_EMAIL_TEMPLATES[new_status].format(full_name=customer['full_name'], order_id=request.order_id),
+            request.order_id
+        ),
         "order": str(updated_order),
     }
 
 
-def send_email(to: str, message: str):
-    return f"Email sent to {to}: {message}"  # Placeholder for actual email sending logic
+# Orders read, moved and notified per round trip by the bulk status endpoint
+BULK_STATUS_BATCH_SIZE = 1000
+MAX_BULK_STATUS_ORDER_IDS = 10_000
+
+
+async def advance_orders(orders: List[dict], previous_status: str, new_status: str) -> List[dict]:
+    """Move one batch of orders from previous_status to new_status; returns one outcome per order."""
+    results = [
+        {"order_id": order["order_id"], "outcome": "invalid_transition",
+         "detail": f"Order is {order.get('status')}, expected {previous_status}."}
+        for order in orders if order.get("status") != previous_status
+    ]
+    candidates = [order for order in orders if order.get("status") == previous_status]
+
+    # One conditional update for the whole batch
+    moved_ids = await bulk_transition_order_status([order["order_id"] for order in candidates],
+                                                   previous_status, new_status)
+    results.extend({"order_id": order["order_id"], "outcome": "conflict",
+                    "detail": "Order status changed concurrently."}
+                   for order in candidates if order["order_id"] not in moved_ids)
+    moved = [order for order in candidates if order["order_id"] in moved_ids]
+    if not moved:
+        return results
+
+    # Shipping takes stock for all moved orders in one aggregated, all-or-nothing batch. On a shortage
+    # only the orders containing a short product are reverted; the batch is retried without them.
+    if new_status == "Shipped":
+        shipping = moved
+        while shipping:
+            shortages = {shortage["product_id"]: shortage for shortage in await take_stock_for_shipment(shipping)}
+            if not shortages:
+                break
+            held = [order for order in shipping if any(item["product_id"] in shortages for item in order["items"])]
+            await revert_order_status([order["order_id"] for order in held], new_status, previous_status)
+            results.extend(
+                {"order_id": order["order_id"], "outcome": "stock_shortage",
+                 "shortages": [shortages[product_id] for product_id in
+                               dict.fromkeys(item["product_id"] for item in order["items"]) if product_id in shortages]}
+                for order in held
+            )
+            held_ids = {order["order_id"] for order in held}
+            shipping = [order for order in shipping if order["order_id"] not in held_ids]
+        moved = shipping
+        if not moved:
+            return results
+
+    customers = await get_users_by_ids({order["user_id"] for order in moved}, {"_id": 0, "full_name": 1, "email": 1})
+    await notify_many(
+        (customers[order["user_id"]]["email"],
+         STATUS_EMAIL_TEMPLATES[new_status].format(full_name=customers[order["user_id"]]["full_name"],
+                                                   order_id=order["order_id"]),
+         order["order_id"])
+        for order in moved if order["user_id"] in customers
+    )
+    results.extend({"order_id": order["order_id"], "outcome": "updated"} for order in moved)
+    return results
+
+
+@app.put("/panel/orders/bulk-update-status")
+async def bulk_update_order_status(request: BulkUpdateOrderStatusRequest, user: AdminUser):
+    new_status = request.new_status
+    if new_status not in PREVIOUS_ORDER_STATUS:
+        raise HTTPException(status_code=400, detail=f"Orders cannot be moved to status: {new_status}")
+    previous_status = PREVIOUS_ORDER_STATUS[new_status]
+
+    if request.order_ids is not None:
+        if len(request.order_ids) > MAX_BULK_STATUS_ORDER_IDS:
+            raise HTTPException(status_code=400,
+                                detail=f"At most {MAX_BULK_STATUS_ORDER_IDS} order ids can be updated at once")
+        query = {"order_id": {"$in": request.order_ids}}
+    else:
+        query = {"status": previous_status}
+        if request.created_before:
+            query["created_at"] = {"$lt": request.created_before}
+
+    results = []
+    found = set()
+    projection = {"_id": 0, "order_id": 1, "status": 1, "user_id": 1, "items": 1}
+    async for orders in iter_order_batches(BULK_STATUS_BATCH_SIZE, projection, query):
+        found.update(order["order_id"] for order in orders)
+        results.extend(await advance_orders(orders, previous_status, new_status))
+    if request.order_ids is not None:
+        results.extend({"order_id": order_id, "outcome": "not_found"}
+                       for order_id in dict.fromkeys(request.order_ids) if order_id not in found)
+
+    updated = sum(1 for result in results if result["outcome"] == "updated")
+    return {
+        "message": f"{updated} orders updated to {new_status}",
+        "new_status": new_status,
+        "updated": updated,
+        "results": results,
+    }
 
 
-def get_product_by_id(product_id: str):
-    product = products_collection.find_one({"product_id": product_id})
-    return product
+def refund_message(full_name: str, order_id: int, total_price) -> str:
+    return (
+        f"Dear {full_name},\n\n"
+        f"Your order {order_id} has been deleted as requested.\n"
+        f"The total amount of ${total_price} will be refunded.\n\n"
+        f"Thank you for shopping with us."
+    )
 
 
-def get_product_by_name(name: str):
-    product = products_collection.find_one({"name": name})
-    return product
+async def email_response(to: str, message: str, order_id: Optional[int] = None) -> dict:
+    # Queue the email for background delivery and report it the way the API always has
+    await notify(to, message, order_id)
+    response = {f"Email sent to {to}": message}
+    if order_id is not None:
+        response["order_id"] = order_id
+    return response
 
 
 if __name__ == "__main__":
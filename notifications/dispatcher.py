@@ -0,0 +1,125 @@
+import asyncio
+import os
+import statistics
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from database.notification_outbox import build_notification, enqueue_notifications_async, \
+    claim_notifications_async, record_results_async, count_notifications_by_status_async, PENDING
+from notifications.senders import LogSender, SmtpSender
+
+# SMTP delivery is used when OMS_SMTP_HOST is set, otherwise emails are only printed
+SMTP_HOST = os.environ.get("OMS_SMTP_HOST")
+SMTP_PORT = int(os.environ.get("OMS_SMTP_PORT", "25"))
+
+DISPATCH_WORKERS = 2
+DISPATCH_BATCH_SIZE = 50
+DISPATCH_CONCURRENCY = 10  # Emails in flight at once, across all workers
+MAX_ATTEMPTS = 5
+RETRY_DELAY_SECONDS = 2
+LEASE_SECONDS = 60
+IDLE_POLL_SECONDS = 1
+ERROR_BACKOFF_SECONDS = 5
+
+
+class NotificationDispatcher:
+    """
+    Drains the notifications outbox in the background: workers claim batches,
+    send them with a shared concurrency limit and record sent / retry / failed.
+    """
+
+    def __init__(self, sender=None, workers: int = DISPATCH_WORKERS, batch_size: int = DISPATCH_BATCH_SIZE,
+                 concurrency: int = DISPATCH_CONCURRENCY, max_attempts: int = MAX_ATTEMPTS):
+        self.sender = sender or (SmtpSender(SMTP_HOST, SMTP_PORT) if SMTP_HOST else LogSender())
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self.sent_count = 0
+        self.failed_attempts = 0
+        self._latencies = deque(maxlen=1000)  # Seconds from enqueue to delivery, most recent deliveries
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self) -> None:
+        # New notifications were enqueued; don't wait for the idle poll
+        self._wakeup.set()
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                batch = await claim_notifications_async(self.batch_size, LEASE_SECONDS)
+                if batch:
+                    results = await asyncio.gather(*(self._send(notification) for notification in batch))
+                    sent = [notification for notification, ok in zip(batch, results) if ok]
+                    failed = [notification for notification, ok in zip(batch, results) if not ok]
+                    await record_results_async(sent, failed, self.max_attempts, RETRY_DELAY_SECONDS)
+                    continue
+            except Exception as e:
+                # e.g. a transient MongoDB error; claimed notifications are retried once their lease expires
+                print(f"Notification dispatcher error: {e}")
+                await asyncio.sleep(ERROR_BACKOFF_SECONDS)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), IDLE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send(self, notification: dict) -> bool:
+        async with self._semaphore:
+            try:
+                await self.sender.send(notification["to"], notification["message"])
+            except Exception as e:
+                notification["error"] = str(e)
+                self.failed_attempts += 1
+                return False
+        self.sent_count += 1
+        self._latencies.append((datetime.now() - notification["created_at"]).total_seconds())
+        return True
+
+    async def stats(self) -> dict:
+        by_status = await count_notifications_by_status_async()
+        latencies = sorted(self._latencies)
+        return {
+            "queue_depth": by_status.get(PENDING, 0),
+            "by_status": by_status,
+            "sent_by_this_worker": self.sent_count,
+            "failed_attempts_by_this_worker": self.failed_attempts,
+            "dispatch_latency_seconds": {
+                "p50": statistics.median(latencies) if latencies else None,
+                "p95": latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else None,
+                "max": latencies[-1] if latencies else None,
+            },
+        }
+
+
+notification_dispatcher = NotificationDispatcher()
+
+
+async def notify(to: str, message: str, order_id: Optional[int] = None) -> str:
+    """
+    Queue one email in the outbox and return the text the API reports for it.
+    The outbox insert is its own write after the caller's order change (no transactions on a standalone
+    mongod), so a crash between the two loses this email.
+    """
+    await enqueue_notifications_async([build_notification(to, message, order_id)])
+    notification_dispatcher.wake()
+    return f"Email sent to {to}: {message}"
+
+
+async def notify_many(notifications) -> int:
+    """Queue (to, message, order_id) triples with one insert."""
+    count = await enqueue_notifications_async([build_notification(*notification) for notification in notifications])
+    notification_dispatcher.wake()
+    return count
@@ -0,0 +1,34 @@
+import asyncio
+import smtplib
+from email.message import EmailMessage
+
+SENDER_ADDRESS = "oms@example.com"
+SUBJECT = "Order Management System"
+
+
+class LogSender:
+    """Placeholder delivery: prints the email (the behavior of the original send_email)."""
+
+    async def send(self, to: str, message: str) -> None:
+        print(f"Email sent to {to}: {message}")
+
+
+class SmtpSender:
+    """Delivers through an SMTP server; smtplib runs in a thread so the event loop never waits on the mail server."""
+
+    def __init__(self, host: str, port: int, timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _send_blocking(self, to: str, message: str) -> None:
+        email = EmailMessage()
+        email["From"] = SENDER_ADDRESS
+        email["To"] = to
+        email["Subject"] = SUBJECT
+        email.set_content(message)
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(email)
+
+    async def send(self, to: str, message: str) -> None:
+        await asyncio.to_thread(self._send_blocking, to, message)
@@ -0,0 +1,45 @@
+"""
+Local SMTP stand-in for development and tests.
+
+    python -m notifications.smtp_stub --port 8025
+    OMS_SMTP_HOST=127.0.0.1 OMS_SMTP_PORT=8025 uvicorn main:app
+"""
+import argparse
+import time
+
+from aiosmtpd.controller import Controller
+
+
+class RecordingHandler:
+    """Keeps every received message in memory and prints it."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        content = envelope.content.decode("utf-8", errors="replace")
+        self.messages.append({"to": envelope.rcpt_tos, "content": content})
+        print(f"Received email for {', '.join(envelope.rcpt_tos)}")
+        return "250 Message accepted for delivery"
+
+
+def start_stub(host: str = "127.0.0.1", port: int = 8025):
+    """Start the stand-in in a background thread; returns (controller, handler). Call controller.stop() when done."""
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname=host, port=port)
+    controller.start()
+    return controller, handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local SMTP stand-in that records OMS emails")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+    controller, _ = start_stub(args.host, args.port)
+    print(f"SMTP stand-in listening on {args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        controller.stop()
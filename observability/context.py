@@ -0,0 +1,25 @@
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+UNMATCHED_ROUTE = "unmatched"  # 404s are grouped so arbitrary paths don't become metric labels
+
+
+class RequestContext:
+    """What one HTTP request has done so far; set by RequestMetricsMiddleware for the request's lifetime."""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.method = scope["method"]
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        self.commands_by_name = Counter()
+
+    @property
+    def route(self) -> str:
+        # The router stores the matched route in the (shared) scope before the endpoint runs
+        route = self.scope.get("route")
+        return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+current_request: ContextVar[Optional[RequestContext]] = ContextVar("current_request", default=None)
@@ -0,0 +1,94 @@
+"""
+Minimal in-process Prometheus metrics (counters and histograms) rendered in the text exposition format.
+Values are per worker process; scrape every worker.
+"""
+import threading
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+HTTP_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MONGO_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: Sequence[str], amount: float = 1) -> None:
+        with self._lock:
+            self._values[tuple(label_values)] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, label_values)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}  # Per bucket, not cumulative; last slot is +Inf
+        self._sums: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: Sequence[str], value: float) -> None:
+        label_values = tuple(label_values)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            counts = self._counts.setdefault(label_values, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[label_values] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, counts in sorted(self._counts.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, label_values)} {self._sums[label_values]:g}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, label_values)} {cumulative}")
+        return lines
+
+
+http_requests_total = Counter("oms_http_requests_total", "HTTP requests by route and status code.",
+                              ["method", "route", "status"])
+http_request_duration_seconds = Histogram("oms_http_request_duration_seconds", "HTTP request latency.",
+                                          ["method", "route"], HTTP_LATENCY_BUCKETS)
+mongo_commands_total = Counter("oms_mongo_commands_total", "MongoDB commands by the route that issued them.",
+                               ["route", "command"])
+mongo_command_failures_total = Counter("oms_mongo_command_failures_total", "Failed MongoDB commands.",
+                                       ["route", "command"])
+mongo_command_duration_seconds = Histogram("oms_mongo_command_duration_seconds",
+                                           "MongoDB command latency by the route that issued it.",
+                                           ["route", "command"], MONGO_LATENCY_BUCKETS)
+
+REGISTRY = [http_requests_total, http_request_duration_seconds, mongo_commands_total, mongo_command_failures_total,
+            mongo_command_duration_seconds]
+
+
+def render_metrics() -> bytes:
+    return ("\n".join(line for metric in REGISTRY for line in metric.render()) + "\n").encode("utf-8")
@@ -0,0 +1,37 @@
+import time
+
+from observability.context import RequestContext, current_request
+from observability.metrics import http_requests_total, http_request_duration_seconds
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware: counts requests per route and status code and times them (streamed bodies included).
+    The request's RequestContext is current for its whole lifetime, so MongoDB commands can be attributed to it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestContext(scope)
+        token = current_request.set(request)
+        status = 500  # Reported if the app fails before sending a response
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_total.inc((request.method, request.route, str(status)))
+            http_request_duration_seconds.observe((request.method, request.route), time.perf_counter() - started)
+            current_request.reset(token)
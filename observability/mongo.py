@@ -0,0 +1,35 @@
+from pymongo import monitoring
+
+from observability.context import current_request
+from observability.metrics import mongo_commands_total, mongo_command_failures_total, mongo_command_duration_seconds
+
+BACKGROUND_ROUTE = "background"  # Commands issued outside a request: notification dispatcher, startup
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Attributes every MongoDB command's count and duration to the route of the request that issued it."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        mongo_command_failures_total.inc((self._record(event), event.command_name))
+
+    @staticmethod
+    def _record(event) -> str:
+        seconds = event.duration_micros / 1_000_000
+        request = current_request.get()
+        if request is not None:
+            request.mongo_commands += 1
+            request.mongo_seconds += seconds
+            request.commands_by_name[event.command_name] += 1
+        route = request.route if request else BACKGROUND_ROUTE
+        mongo_commands_total.inc((route, event.command_name))
+        mongo_command_duration_seconds.observe((route, event.command_name), seconds)
+        return route
+
+
+command_metrics_listener = CommandMetricsListener()
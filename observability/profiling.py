@@ -0,0 +1,256 @@
+"""
+On-demand request profiling.
+
+A request is profiled when an admin asks for it (header "X-Profile: 1" or query "?profile=1" with an
+admin token; ignored for anyone else) or when it is picked by the sampling rate (OMS_PROFILE_SAMPLE_RATE,
+default 0, adjustable at runtime on PUT /panel/profiles/sampling). While the request runs, a thread samples
+its stack every OMS_PROFILE_INTERVAL_MS. When the request's coroutine is suspended, the sample is the
+awaiting coroutine chain ending in "[awaiting I/O]", which separates Python work from MongoDB waits.
+
+Each profile is written to OMS_PROFILE_DIR in the collapsed-stack format ("frame;frame;frame count"),
+which flamegraph.pl, inferno and speedscope read directly. index.jsonl in the same directory lists the
+profiles with their route and duration (GET /panel/profiles).
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+from urllib.parse import parse_qs
+
+try:
+    import fcntl
+except ImportError:  # Windows: the index is only locked between threads of one worker
+    fcntl = None
+
+PROFILE_DIR = os.environ.get("OMS_PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.environ.get("OMS_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("OMS_PROFILE_INTERVAL_MS", "5"))
+MAX_CONCURRENT_PROFILES = 4
+MAX_PROFILE_FILES = 500  # Oldest profiles are deleted beyond this
+PRUNE_BATCH = 50
+INDEX_FILE = "index.jsonl"
+INDEX_LOCK_FILE = "index.lock"
+PROFILE_NAME = re.compile(r"^[\w.-]+\.collapsed$")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    else:
+        filename = "/".join(filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _awaiting_stack(coroutine) -> List[str]:
+    # Outermost to innermost along the chain of awaits of a suspended coroutine
+    stack = []
+    awaitable = coroutine
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "ag_frame", None) \
+            or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(frame_label(frame.f_code))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "ag_await", None) \
+            or getattr(awaitable, "gi_yieldfrom", None)
+    stack.append("[awaiting I/O]")
+    return stack
+
+
+class StackSampler:
+    """Samples one asyncio task's stack from a background thread."""
+
+    def __init__(self, task: asyncio.Task, thread_id: int, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.task = task
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.stacks[";".join(self._sample())] += 1
+
+    def _sample(self) -> List[str]:
+        coroutine = self.task.get_coro()
+        outer_frame = getattr(coroutine, "cr_frame", None)
+        frame = sys._current_frames().get(self.thread_id)
+        running = []
+        while frame is not None:
+            running.append(frame_label(frame.f_code))
+            if frame is outer_frame:
+                return list(reversed(running))  # The task is running: its frames up to the innermost call
+            frame = frame.f_back
+        return _awaiting_stack(coroutine)
+
+
+class RequestProfiler:
+    """Settings, storage and index of request profiles, shared by ProfilingMiddleware and the admin routes."""
+
+    def __init__(self, directory: str = PROFILE_DIR, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.authorize: Optional[Callable[[str], Awaitable[bool]]] = None  # token -> may this caller profile?
+        self.active = 0
+        self._lock = threading.Lock()
+
+    async def trigger(self, scope: dict) -> Optional[str]:
+        """Why this request should be profiled ("requested" / "sampled"), or None."""
+        if self.active >= MAX_CONCURRENT_PROFILES:
+            return None
+        headers = dict(scope.get("headers", []))
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if headers.get(b"x-profile") == b"1" or query.get("profile") == ["1"]:
+            authorization = headers.get(b"authorization", b"").decode("latin-1")
+            if self.authorize and authorization.startswith("Bearer ") and await self.authorize(authorization[7:]):
+                return "requested"
+            return None
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    @contextmanager
+    def _index_lock(self):
+        # Serializes index appends and rewrites across this worker's threads and (where flock exists) all workers
+        with self._lock, open(os.path.join(self.directory, INDEX_LOCK_FILE), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def save(self, entry: dict, stacks: Counter) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, entry["file"]), "w") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        with self._index_lock(), open(os.path.join(self.directory, INDEX_FILE), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        self._prune()
+
+    def _prune(self) -> None:
+        # In batches, so the index is rewritten once per PRUNE_BATCH profiles rather than on every save
+        names = sorted(name for name in os.listdir(self.directory) if PROFILE_NAME.match(name))
+        if len(names) <= MAX_PROFILE_FILES + PRUNE_BATCH:
+            return
+        with self._index_lock():
+            for name in names[:-MAX_PROFILE_FILES]:  # Names start with a timestamp, so oldest first
+                if os.path.exists(os.path.join(self.directory, name)):  # Another worker may have pruned it
+                    os.remove(os.path.join(self.directory, name))
+            kept = set(names[-MAX_PROFILE_FILES:])
+            path = os.path.join(self.directory, INDEX_FILE)
+            # Profiles saved since the listing above are newer than every kept name, so they stay too
+            newest = names[-1]
+            entries = [entry for entry in self._read_index() if entry["file"] in kept or entry["file"] > newest]
+            with open(path + ".tmp", "w") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in entries)
+            os.replace(path + ".tmp", path)
+
+    def _read_index(self) -> List[dict]:
+        path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(path):
+            return []
+        entries = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue  # Blank, or a line another process is still writing
+        return [entry for entry in entries if isinstance(entry, dict) and "file" in entry]
+
+    def recent(self, limit: int = 50, route: Optional[str] = None, sort: str = "recent") -> List[dict]:
+        entries = [entry for entry in self._read_index() if (route is None or entry.get("route") == route)
+                   and os.path.exists(os.path.join(self.directory, entry["file"]))]
+        if sort == "duration":
+            entries.sort(key=lambda entry: entry.get("duration_ms", 0), reverse=True)
+        else:
+            entries.reverse()
+        return entries[:limit]
+
+    def path_of(self, name: str) -> Optional[str]:
+        if not PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+
+request_profiler = RequestProfiler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles the requests request_profiler picks and saves their profiles."""
+
+    def __init__(self, app, profiler: RequestProfiler = request_profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = await self.profiler.trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        sampler = StackSampler(asyncio.current_task(), threading.get_ident())
+        started_at = datetime.now()
+        started = time.perf_counter()
+        saved = False
+
+        async def save_profile():
+            nonlocal saved
+            if saved:
+                return
+            saved = True
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            # stop() joins the sampler thread, which can take up to one sampling interval
+            await asyncio.to_thread(sampler.stop)
+            self.profiler.active -= 1
+            route = getattr(scope.get("route"), "path", scope["path"])
+            slug = re.sub(r"[^\w]+", "_", route).strip("_") or "root"
+            entry = {
+                "file": f"{started_at:%Y%m%dT%H%M%S%f}-{os.getpid()}-{scope['method']}-{slug}.collapsed",
+                "time": started_at.isoformat(timespec="milliseconds"),
+                "method": scope["method"],
+                "route": route,
+                "path": scope["path"],
+                "status": status,
+                "duration_ms": duration_ms,
+                "samples": sum(sampler.stacks.values()),
+                "trigger": trigger,
+            }
+            await asyncio.to_thread(self.profiler.save, entry, sampler.stacks)
+
+        async def send_profiled(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                await save_profile()  # Before the response completes, so the caller can list the profile right away
+            await send(message)
+
+        self.profiler.active += 1
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            await save_profile()
@@ -0,0 +1,69 @@
+"""
+Per-request MongoDB command budgets.
+
+Routes declare the most commands one request may issue:
+
+    @app.get("/orders/{order_id}")
+    @query_budget(3)
+    async def user_get_order_by_id(...): ...
+
+The commands a request issued before its response started (streamed bodies are unbounded by design)
+are compared with the budget. OMS_QUERY_BUDGET selects what happens:
+
+    warn  report the count and budget in response headers and log a warning when over budget (staging, tests)
+    off   do nothing (default: the headers expose internals)
+
+tests_api fails any test whose responses report more commands than their budget, or come from a
+budgeted route without the headers (server not started with OMS_QUERY_BUDGET=warn); see conftest.py.
+"""
+import logging
+import os
+from typing import Optional
+
+from observability.context import current_request
+
+QUERY_BUDGET_MODE = os.environ.get("OMS_QUERY_BUDGET", "off")
+COMMANDS_HEADER = "x-mongo-commands"
+BUDGET_HEADER = "x-mongo-budget"
+
+logger = logging.getLogger("oms.query_budget")
+
+
+def query_budget(max_commands: int):
+    """Declare the most MongoDB commands one request to the decorated route may issue."""
+    def decorator(endpoint):
+        endpoint.query_budget = max_commands
+        return endpoint
+    return decorator
+
+
+def route_budget(scope: dict) -> Optional[int]:
+    return getattr(getattr(scope.get("route"), "endpoint", None), "query_budget", None)
+
+
+class QueryBudgetMiddleware:
+    """Checks each request against its route's budget; needs the RequestContext set by RequestMetricsMiddleware."""
+
+    def __init__(self, app, mode: str = QUERY_BUDGET_MODE):
+        self.app = app
+        self.mode = mode
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_budget(message):
+            request = current_request.get()
+            budget = route_budget(scope)
+            if message["type"] == "http.response.start" and request is not None and budget is not None:
+                commands = request.mongo_commands
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (COMMANDS_HEADER.encode(), str(commands).encode()),
+                                                  (BUDGET_HEADER.encode(), str(budget).encode())]}
+                if commands > budget:
+                    logger.warning("%s %s issued %d MongoDB commands, over its budget of %d (%s)", request.method,
+                                   request.route, commands, budget, dict(request.commands_by_name))
+            await send(message)
+
+        await self.app(scope, receive, send_with_budget)
@@ -0,0 +1,239 @@
+"""
+Slow MongoDB operation recorder, registered on the app's AsyncMongoClient.
+
+Every command slower than OMS_SLOW_QUERY_MS is recorded with its query shape (field names and operators,
+values redacted), the app function that issued it, the route and the duration. A sample of them
+(OMS_SLOW_QUERY_EXPLAIN_RATE, at most once per shape per cooldown) is re-run in the background with
+explain("executionStats"), so collection scans and poor index choices are visible. Records go to a
+rotating JSON-lines log (OMS_SLOW_QUERY_LOG) and to GET /panel/diagnostics/slow-queries.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+from pymongo import monitoring
+
+from observability.context import current_request
+
+SLOW_QUERY_MS = float(os.environ.get("OMS_SLOW_QUERY_MS", "100"))
+EXPLAIN_SAMPLE_RATE = float(os.environ.get("OMS_SLOW_QUERY_EXPLAIN_RATE", "0.2"))
+EXPLAIN_COOLDOWN_SECONDS = 60  # Per query shape
+MAX_PENDING_EXPLAINS = 2
+SLOW_QUERY_LOG = os.environ.get("OMS_SLOW_QUERY_LOG", "logs/slow_queries.log")
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+RECENT_SLOW_QUERIES = 200
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OBSERVABILITY_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Commands explain can run, and the parts of each that make up its query shape
+QUERY_PARTS = {
+    "find": ("filter", "sort", "projection"),
+    "aggregate": ("pipeline",),
+    "count": ("query",),
+    "distinct": ("key", "query"),
+    "findAndModify": ("query", "sort"),
+    "update": ("updates",),
+    "delete": ("deletes",),
+}
+# Session, transaction and routing fields the driver adds; explain rejects or ignores them
+DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "writeConcern", "readConcern",
+                 "$db", "$clusterTime", "$readPreference"}
+
+
+def redact(value):
+    """Keep field names and operators, replace every value with "?" (arrays keep one element's shape)."""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(value[0])] if value else []
+    return "?"
+
+
+def keys_and_directions(spec: dict) -> dict:
+    """Sort / projection spec: keep field names and numeric directions (1, -1, 0), redact anything else."""
+    return {key: value if isinstance(value, (int, float)) else redact(value) for key, value in spec.items()}
+
+
+def query_shape(command_name: str, command: dict) -> dict:
+    shape = {}
+    for part in QUERY_PARTS.get(command_name, ()):
+        if part not in command:
+            continue
+        if part in ("updates", "deletes"):
+            # Shape of the first statement's filter; the documents written are not part of the shape
+            statements = command[part]
+            shape["q"] = redact(statements[0].get("q", {})) if statements else {}
+        elif part == "key":
+            shape[part] = command[part]  # A field name
+        elif part in ("sort", "projection"):
+            shape[part] = keys_and_directions(command[part])
+        else:
+            shape[part] = redact(command[part])
+    return shape
+
+
+def calling_function() -> Optional[str]:
+    # Innermost app frame (not the driver, asyncio or this package) on the awaiting coroutine chain
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(PROJECT_ROOT) and not filename.startswith(OBSERVABILITY_DIR) \
+                and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return None
+
+
+def summarize_plan(explain: dict) -> dict:
+    if "queryPlanner" not in explain and explain.get("stages"):
+        explain = explain["stages"][0].get("$cursor", {})  # Aggregations: the plan of the initial query
+    planner = explain.get("queryPlanner", {})
+    stats = explain.get("executionStats", {})
+    stages, indexes = [], []
+    pending = [planner.get("winningPlan", {})]
+    while pending:
+        stage = pending.pop()
+        stage = stage.get("queryPlan", stage)  # Slot-based engine wraps the classic plan tree
+        if "stage" in stage:
+            stages.append(stage["stage"])
+        if "indexName" in stage:
+            indexes.append(stage["indexName"])
+        pending.extend(stage.get("inputStages", []))
+        if "inputStage" in stage:
+            pending.append(stage["inputStage"])
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "collscan": "COLLSCAN" in stages,
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis"),
+    }
+
+
+def _explainable(command_name: str, command: dict) -> dict:
+    command = {key: value for key, value in command.items() if key not in DRIVER_FIELDS}
+    for part in ("updates", "deletes"):
+        if part in command:
+            command[part] = command[part][:1]  # explain only accepts single-statement writes
+    return command
+
+
+class SlowQueryRecorder(monitoring.CommandListener):
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, explain_rate: float = EXPLAIN_SAMPLE_RATE,
+                 log_path: str = SLOW_QUERY_LOG):
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self.log_path = log_path
+        self.client = None  # Set to the AsyncMongoClient used for explains
+        self.recent = deque(maxlen=RECENT_SLOW_QUERIES)
+        self.by_shape = {}
+        self._started = {}  # request_id -> (database, command) of explainable commands in flight
+        self._last_explained = {}  # shape key -> monotonic time
+        self._pending_explains = set()
+        self._logger = None
+
+    def started(self, event):
+        if event.command_name in QUERY_PARTS:
+            self._started[event.request_id] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event) -> None:
+        database, command = self._started.pop(event.request_id, (None, None))
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms or event.command_name == "explain":
+            return
+        request = current_request.get()
+        command = command or {}
+        record = {
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "command": event.command_name,
+            "database": database,
+            "collection": command.get(event.command_name),
+            "duration_ms": round(duration_ms, 1),
+            "route": request.route if request else None,
+            "caller": calling_function(),
+            "shape": query_shape(event.command_name, command),
+            "explain": None,
+        }
+        self.recent.append(record)
+        shape_key = json.dumps([record["collection"], record["command"], record["shape"]], sort_keys=True, default=str)
+        stats = self.by_shape.setdefault(shape_key, {"collection": record["collection"], "command": record["command"],
+                                                     "shape": record["shape"], "count": 0, "total_ms": 0.0,
+                                                     "max_ms": 0.0, "last_caller": None, "last_explain": None})
+        stats["count"] += 1
+        stats["total_ms"] += record["duration_ms"]
+        stats["max_ms"] = max(stats["max_ms"], record["duration_ms"])
+        stats["last_caller"] = record["caller"]
+
+        if command and self._should_explain(shape_key):
+            task = asyncio.get_running_loop().create_task(
+                self._explain(record, stats, database, _explainable(event.command_name, command)))
+            self._pending_explains.add(task)
+            task.add_done_callback(self._pending_explains.discard)
+        else:
+            self._log(record)
+
+    def _should_explain(self, shape_key: str) -> bool:
+        if self.client is None or len(self._pending_explains) >= MAX_PENDING_EXPLAINS:
+            return False
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False  # Not on the event loop (e.g. a blocking client in a script)
+        if time.monotonic() - self._last_explained.get(shape_key, float("-inf")) < EXPLAIN_COOLDOWN_SECONDS:
+            return False
+        if random.random() >= self.explain_rate:
+            return False
+        self._last_explained[shape_key] = time.monotonic()
+        return True
+
+    async def _explain(self, record: dict, stats: dict, database: str, command: dict) -> None:
+        current_request.set(None)  # The explain is diagnostics, not part of the request that triggered it
+        try:
+            explain = await self.client[database].command({"explain": command, "verbosity": "executionStats"})
+            record["explain"] = summarize_plan(explain)
+        except Exception as e:
+            record["explain"] = {"error": str(e)}
+        stats["last_explain"] = record["explain"]
+        self._log(record)
+
+    def _log(self, record: dict) -> None:
+        if self._logger is None:
+            self._logger = logging.getLogger("oms.slow_queries")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            self._logger.addHandler(RotatingFileHandler(self.log_path, maxBytes=SLOW_QUERY_LOG_MAX_BYTES,
+                                                        backupCount=SLOW_QUERY_LOG_BACKUPS))
+        self._logger.info(json.dumps(record, default=str))
+
+    def report(self, limit: int = 50) -> dict:
+        shapes = sorted(self.by_shape.values(), key=lambda stats: stats["total_ms"], reverse=True)
+        return {
+            "threshold_ms": self.threshold_ms,
+            "explain_sample_rate": self.explain_rate,
+            "log": self.log_path,
+            "by_shape": shapes[:limit],
+            "recent": list(reversed(self.recent))[:limit],
+        }
+
+
+slow_query_recorder = SlowQueryRecorder()
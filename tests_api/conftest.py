@@ -2,11 +2,16 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../utils')))
 import base64
+import warnings
+from urllib.parse import urlsplit
+from fastapi.routing import APIRoute
 from pymongo import MongoClient
 import pytest
 import requests
 from utils.constants import API_LOGIN_URL, API_CART_URL, API_CHECKOUT_URL, API_ORDERS_URL
 from database.user_queries import users_data
+from observability.query_budget import BUDGET_HEADER, COMMANDS_HEADER
+from main import app
 
 
 @pytest.fixture(scope="session")
@@ -71,3 +76,42 @@ def products_collection(test_db):
 @pytest.fixture(scope="session")
 def orders_collection(test_db):
     return test_db["orders"]
+
+
+############ MONGO QUERY BUDGET ###################
+# With the server started with OMS_QUERY_BUDGET=warn, every response of a route with a @query_budget
+# reports how many MongoDB commands it issued, and a test fails if any of its requests went over budget.
+# With budgets off (the default) nothing is checked and a warning says so.
+def route_budget(method, url):
+    # The budget of the route the server matches for this request, in the same order as the server
+    path = urlsplit(url).path
+    for route in app.routes:
+        if isinstance(route, APIRoute) and method in route.methods and route.path_regex.match(path):
+            return getattr(route.endpoint, "query_budget", None)
+    return None
+
+
+@pytest.fixture(autouse=True)
+def mongo_query_budget(monkeypatch):
+    violations = []
+    unchecked = []
+    send = requests.Session.send
+
+    def send_and_check_budget(session, request, **kwargs):
+        response = send(session, request, **kwargs)
+        budget = response.headers.get(BUDGET_HEADER)
+        commands = response.headers.get(COMMANDS_HEADER)
+        if budget is None:
+            if route_budget(request.method, request.url) is not None:
+                unchecked.append(f"{request.method} {request.url}")
+        elif int(commands) > int(budget):
+            violations.append(f"{request.method} {request.url}: {commands} MongoDB commands, budget {budget}")
+        return response
+
+    monkeypatch.setattr(requests.Session, "send", send_and_check_budget)
+    yield violations
+    if unchecked:
+        warnings.warn(f"MongoDB query budgets not checked for {len(unchecked)} requests: "
+                      f"start the server with OMS_QUERY_BUDGET=warn to check them")
+    if violations:
+        pytest.fail("MongoDB query budget exceeded:\n" + "\n".join(violations))
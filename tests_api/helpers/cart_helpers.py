@@ -51,4 +51,16 @@ def add_to_cart_and_checkout(token):
         response_checkout = requests.post(API_CHECKOUT_URL, headers=headers, json=card_payload)
 
     assert response_checkout.status_code == 200, f"Failed to checkout. Status code: {response_checkout.status_code}"
-    return response_checkout, cart_payload
\ No newline at end of file
+    return response_checkout, cart_payload
+
+
+def checkout_items(token, items):
+    # Replace the cart with items and check out until the payment goes through
+    clear_cart(token)
+    add_items_to_cart(token, items)
+    headers = get_auth_headers(token)
+    response_checkout = requests.post(API_CHECKOUT_URL, headers=headers, json=card_payload)
+    while "card was declined" in response_checkout.text:
+        response_checkout = requests.post(API_CHECKOUT_URL, headers=headers, json=card_payload)
+    assert "Confirmation" in response_checkout.text, f"Checkout failed: {response_checkout.text}"
+    return response_checkout.json()["order_id"]
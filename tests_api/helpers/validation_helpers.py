@@ -1,11 +1,18 @@
+import time
+
 import jwt
 import requests
 import pytest
 
 from database.order_queries import get_order_by_id
+from database.product_catalog import CATALOG_VERSION_CHECK_SECONDS
+from database.token_cache import TOKEN_CACHE_VERSION_CHECK_SECONDS
 from database.user_queries import get_user_by_id, SECRET_KEY
 from utils.constants import API_ORDERS_ADMIN, API_UPDATE_STATUS_ADMIN
 
+# Every server worker polls the shared cache version stamps, so a bump is seen within one interval
+CACHE_REFRESH_TIMEOUT = max(TOKEN_CACHE_VERSION_CHECK_SECONDS, CATALOG_VERSION_CHECK_SECONDS) + 2
+
 
 def get_auth_headers(token):
     return {"Authorization": f"Bearer {token}"}
@@ -67,3 +74,13 @@ def change_order_status(headers, order_id, new_status):
     assert status_change_response.status_code == 200, f"Status change failed for {order_id} to {new_status}"
     status_changed_data = status_change_response.json()
     assert new_status in status_changed_data["message"], f"Failed to update status to {new_status}"
+
+
+def wait_for_response(send, accept, timeout=CACHE_REFRESH_TIMEOUT):
+    # Repeat the request until the response is accepted or the timeout passes, and return the last one
+    deadline = time.monotonic() + timeout
+    response = send()
+    while not accept(response) and time.monotonic() < deadline:
+        time.sleep(0.2)
+        response = send()
+    return response
@@ -1,3 +1,7 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from database.cache_versions import bump_version
+from database.product_catalog import PRODUCTS_CACHE_VERSION
 from tests_api.helpers.cart_helpers import *
 from tests_api.helpers.validation_helpers import *
 from utils.constants import API_ALL_PRODUCTS, API_PRODUCT_URL, API_CART_URL, API_CHECKOUT_URL
@@ -28,6 +32,31 @@ def test_get_product_by_id(get_user_token, products_collection):
         'name'], f"Product name should contain 'Laptop', got {product_data['product']['name']}"
 
 
+def test_product_reads_follow_catalog_writes(get_user_token, products_collection):
+    headers = get_auth_headers(get_user_token)
+    original_price = products_collection.find_one({"product_id": "p006"})["price"]
+    new_price = original_price + 7
+
+    def product_price(response):
+        return response.json()['product']['price']
+
+    # Load the catalog, then change a price the way any catalog write does: update, then bump the version
+    requests.get(f"{API_PRODUCT_URL}/p006", headers=headers)
+    products_collection.update_one({"product_id": "p006"}, {"$set": {"price": new_price}})
+    bump_version(PRODUCTS_CACHE_VERSION)
+    try:
+        response = wait_for_response(lambda: requests.get(f"{API_PRODUCT_URL}/p006", headers=headers),
+                                     lambda response: product_price(response) == new_price)
+        assert product_price(response) == new_price, f"Expected price {new_price}, got {product_price(response)}"
+        # The pre-serialized /products body is rebuilt for the new catalog version too
+        products = requests.get(API_ALL_PRODUCTS, headers=headers).json()['products']
+        mousepad = next(product for product in products if product['product_id'] == "p006")
+        assert mousepad['price'] == new_price, f"Expected price {new_price} in /products, got {mousepad['price']}"
+    finally:
+        products_collection.update_one({"product_id": "p006"}, {"$set": {"price": original_price}})
+        bump_version(PRODUCTS_CACHE_VERSION)
+
+
 def test_add_to_cart_and_verify(get_user_token):
     user_id = decode_user_token(get_user_token)
     headers = get_auth_headers(get_user_token)
@@ -148,4 +177,54 @@ def test_multiple_products_in_cart(get_user_token, items):
 
     #Clear cart and verify it's empty
     response = clear_cart(get_user_token)
-    assert response['cart'] == [], "Cart should be empty after clearing"
\ No newline at end of file
+    assert response['cart'] == [], "Cart should be empty after clearing"
+
+def test_update_cart_merges_repeated_lines(get_user_token):
+    clear_cart(get_user_token)
+    cart_payload = [
+        {"product_id": "p001", "name": "Laptop", "quantity": 1},
+        {"product_id": "p002", "name": "Mouse", "quantity": 2},
+        {"product_id": "p001", "name": "Laptop", "quantity": 3},
+    ]
+    cart_data = add_items_to_cart(get_user_token, cart_payload)
+    assert len(cart_data['cart']) == 2, f"Expected 2 cart lines, got {cart_data['cart']}"
+    verify_cart_item(cart_data['cart'][0], "p001", "Laptop", 4, 1200)
+    verify_cart_item(cart_data['cart'][1], "p002", "Mouse", 2, 25)
+
+
+@pytest.mark.parametrize("cart_payload, expected_detail", [
+    ([{"product_id": "p001", "name": "Laptop", "quantity": 1},
+      {"product_id": "p999", "name": "Ghost", "quantity": 1}], "Invalid product_id: p999"),
+    ([{"product_id": "p001", "name": "Mouse", "quantity": 1}], "Product name mismatch: Mouse"),
+    ([{"product_id": "p001", "name": "Laptop", "quantity": 11}], "must be between 1 and 10"),
+])
+def test_update_cart_rejects_invalid_lines(get_user_token, cart_payload, expected_detail):
+    clear_cart(get_user_token)
+    headers = get_auth_headers(get_user_token)
+    response = requests.put(API_CART_URL, headers=headers, json=cart_payload)
+    assert response.status_code == 400, f"Expected 400, got {response.status_code}"
+    assert expected_detail in response.json()["detail"]
+    # Nothing is written when any line is invalid
+    assert get_user_cart(get_user_token)['cart'] == []
+
+
+def test_concurrent_cart_updates_keep_every_increment(get_user_token):
+    clear_cart(get_user_token)
+    headers = get_auth_headers(get_user_token)
+    requests_count = 10
+    cart_payload = [{"product_id": "p003", "name": "Keyboard", "quantity": 1}]
+
+    def put_cart(_):
+        return requests.put(API_CART_URL, headers=headers, json=cart_payload).status_code
+
+    # Every request starts from an empty cart line, so none of them may overwrite another's increment
+    with ThreadPoolExecutor(max_workers=requests_count) as executor:
+        statuses = list(executor.map(put_cart, range(requests_count)))
+    assert statuses == [200] * requests_count, f"Expected only 200 responses, got {statuses}"
+
+    cart = get_user_cart(get_user_token)['cart']
+    assert len(cart) == 1, f"Expected one cart line, got {cart}"
+    verify_cart_item(cart[0], "p003", "Keyboard", requests_count, 60)
+    user_in_db = get_user_by_id(decode_user_token(get_user_token))
+    verify_cart_item(user_in_db['cart'][0], "p003", "Keyboard", requests_count, 60)
+    clear_cart(get_user_token)
@@ -1,6 +1,11 @@
 import requests
 import pytest
-from utils.constants import API_LOGIN_URL, API_PANEL_ADMIN
+from database.cache_versions import bump_version
+from database.token_cache import USERS_CACHE_VERSION
+from database.user_queries import generate_token
+from tests_api.helpers.validation_helpers import get_auth_headers, wait_for_response
+from utils.constants import API_LOGIN_URL, API_PANEL_ADMIN, API_ORDERS_ADMIN, API_ORDERS_STATUS_ADMIN, \
+    API_UPDATE_STATUS_ADMIN, API_STARTUP_ADMIN, API_SLOW_QUERIES_ADMIN, API_CART_URL
 
 
 @pytest.mark.parametrize("payload, expected_status, expected_token, admin_access_expected_status, expected_detail", [
@@ -23,3 +28,75 @@ def test_login_and_admin_access(payload, expected_status, expected_token, admin_
         assert admin_response.status_code == admin_access_expected_status, f"Expected {admin_access_expected_status}, got {admin_response.status_code}"
         if admin_access_expected_status == 200:
             assert "Welcome to the admin panel" in admin_response.json().get("message", "")
+
+
+@pytest.mark.parametrize("method, url", [
+    ("get", API_PANEL_ADMIN),
+    ("get", API_ORDERS_ADMIN),
+    ("get", f"{API_ORDERS_STATUS_ADMIN}/pending"),
+    ("get", f"{API_ORDERS_ADMIN}/1"),
+    ("put", API_UPDATE_STATUS_ADMIN),
+])
+def test_admin_routes_reject_customer_and_invalid_tokens(get_user_token, method, url):
+    # Regular users are authenticated but not allowed on the admin panel
+    response = requests.request(method, url, headers={"Authorization": f"Bearer {get_user_token}"},
+                                json={"order_id": 1, "new_status": "Processing"})
+    assert response.status_code == 403, f"Expected 403, got {response.status_code}"
+    # Garbage tokens are rejected before any role check
+    response = requests.request(method, url, headers={"Authorization": "Bearer invalid"},
+                                json={"order_id": 1, "new_status": "Processing"})
+    assert response.status_code == 401, f"Expected 401, got {response.status_code}"
+
+
+def test_admin_can_read_startup_timings(get_admin_token):
+    response = requests.get(API_STARTUP_ADMIN, headers={"Authorization": f"Bearer {get_admin_token}"})
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    report = response.json()
+    assert report["mode"] in ("reset", "seed-if-empty", "none")
+    assert "indexes" in report["phases_ms"], f"Missing index phase in {report['phases_ms']}"
+    assert report["total_ms"] >= 0
+
+
+def test_slow_query_diagnostics_are_admin_only(get_user_token, get_admin_token):
+    response = requests.get(API_SLOW_QUERIES_ADMIN, headers={"Authorization": f"Bearer {get_user_token}"})
+    assert response.status_code == 403, f"Expected 403, got {response.status_code}"
+    response = requests.get(API_SLOW_QUERIES_ADMIN, headers={"Authorization": f"Bearer {get_admin_token}"})
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    report = response.json()
+    assert report["threshold_ms"] > 0
+    assert isinstance(report["by_shape"], list) and isinstance(report["recent"], list)
+
+
+def test_token_cache_follows_role_changes_and_revoked_tokens(users_collection):
+    # A user of its own, so the session tokens of the other tests stay valid
+    user_id, email = "u_token_cache", "token.cache@example.com"
+    token = generate_token(user_id, email, {"is_admin": False})
+    users_collection.delete_many({"user_id": user_id})
+    users_collection.insert_one({"user_id": user_id, "full_name": "Token Cache", "email": email,
+                                 "role": {"is_admin": False}, "token": token, "cart": [], "orders": []})
+    bump_version(USERS_CACHE_VERSION)
+    headers = get_auth_headers(token)
+    try:
+        response = wait_for_response(lambda: requests.get(API_CART_URL, headers=headers),
+                                     lambda response: response.status_code == 200)
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        # The token is now cached as a customer's
+        response = requests.get(API_PANEL_ADMIN, headers=headers)
+        assert response.status_code == 403, f"Expected 403, got {response.status_code}"
+
+        # Role change, written like any other worker would: update the user, then bump the version
+        users_collection.update_one({"user_id": user_id}, {"$set": {"role.is_admin": True}})
+        bump_version(USERS_CACHE_VERSION)
+        response = wait_for_response(lambda: requests.get(API_PANEL_ADMIN, headers=headers),
+                                     lambda response: response.status_code == 200)
+        assert response.status_code == 200, f"Role change not picked up, got {response.status_code}"
+
+        # Logout: the stored token is replaced, so the old one must stop working
+        users_collection.update_one({"user_id": user_id}, {"$set": {"token": "logged-out"}})
+        bump_version(USERS_CACHE_VERSION)
+        response = wait_for_response(lambda: requests.get(API_CART_URL, headers=headers),
+                                     lambda response: response.status_code == 401)
+        assert response.status_code == 401, f"Revoked token still accepted, got {response.status_code}"
+    finally:
+        users_collection.delete_many({"user_id": user_id})
+        bump_version(USERS_CACHE_VERSION)
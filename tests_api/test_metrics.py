@@ -0,0 +1,56 @@
+import pytest
+import requests
+
+from utils.constants import API_METRICS_URL, API_ORDERS_URL, API_ORDERS_ADMIN, API_PROFILES_ADMIN
+
+
+def test_metrics_attribute_requests_and_mongo_commands_to_routes(get_user_token):
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    response = requests.get(f"{API_ORDERS_URL}/1", headers=headers)
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+
+    response = requests.get(API_METRICS_URL)
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    assert response.headers["content-type"].startswith("text/plain")
+    metrics = response.text
+    # Route templates are used as labels, never the raw path
+    assert 'oms_http_requests_total{method="GET",route="/orders/{order_id}",status="200"}' in metrics
+    assert 'oms_http_request_duration_seconds_bucket{method="GET",route="/orders/{order_id}",le="+Inf"}' in metrics
+    assert 'oms_mongo_commands_total{route="/orders/{order_id}",command="find"}' in metrics
+    assert 'route="/orders/1"' not in metrics
+
+
+def test_budgeted_routes_report_mongo_command_count(get_user_token):
+    response = requests.get(f"{API_ORDERS_URL}/1", headers={"Authorization": f"Bearer {get_user_token}"})
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    if "x-mongo-budget" not in response.headers:
+        pytest.skip("Query budgets are off; start the server with OMS_QUERY_BUDGET=warn")
+    assert int(response.headers["x-mongo-commands"]) <= int(response.headers["x-mongo-budget"])
+
+
+def test_admin_can_profile_a_request_on_demand(get_user_token, get_admin_token):
+    admin_headers = {"Authorization": f"Bearer {get_admin_token}"}
+    response = requests.get(API_ORDERS_ADMIN, headers={**admin_headers, "X-Profile": "1"}, params={"limit": 5})
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+
+    profiles = requests.get(API_PROFILES_ADMIN, headers=admin_headers, params={"route": "/panel/orders"}).json()
+    assert profiles["profiles"], "Expected a profile for /panel/orders"
+    latest = profiles["profiles"][0]
+    assert latest["trigger"] == "requested" and latest["duration_ms"] > 0
+
+    response = requests.get(f"{API_PROFILES_ADMIN}/{latest['file']}", headers=admin_headers)
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    # Collapsed stacks: "frame;frame;frame count" per line
+    for line in response.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+
+    # Customers cannot turn profiling on
+    def latest_order_profile():
+        profiles = requests.get(API_PROFILES_ADMIN, headers=admin_headers,
+                                params={"route": "/orders/{order_id}", "limit": 1}).json()["profiles"]
+        return profiles[0]["file"] if profiles else None
+
+    before = latest_order_profile()
+    requests.get(f"{API_ORDERS_URL}/1", headers={"Authorization": f"Bearer {get_user_token}", "X-Profile": "1"})
+    assert latest_order_profile() == before, "A customer request was profiled"
@@ -0,0 +1,25 @@
+import asyncio
+import socket
+
+from notifications.senders import SmtpSender, SENDER_ADDRESS
+from notifications.smtp_stub import start_stub
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_smtp_sender_delivers_through_stub():
+    port = free_port()
+    controller, handler = start_stub("127.0.0.1", port)
+    try:
+        asyncio.run(SmtpSender("127.0.0.1", port).send("jane.smith@example.com", "Your order #7 has been shipped."))
+    finally:
+        controller.stop()
+    assert len(handler.messages) == 1, f"Expected one email, got {handler.messages}"
+    message = handler.messages[0]
+    assert message["to"] == ["jane.smith@example.com"]
+    assert f"From: {SENDER_ADDRESS}" in message["content"]
+    assert "Your order #7 has been shipped." in message["content"]
@@ -1,9 +1,16 @@
+import base64
+import json
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 import requests
 from database.order_queries import get_order_by_id
-from tests_api.helpers.cart_helpers import add_to_cart_and_checkout
-from tests_api.helpers.validation_helpers import get_admin_auth_headers, validate_mongodb_state, change_order_status
-from utils.constants import API_CART_URL, API_CHECKOUT_URL, API_ORDERS_ADMIN, API_ORDERS_STATUS_ADMIN
+from database.user_queries import users_data
+from tests_api.helpers.cart_helpers import add_to_cart_and_checkout, add_items_to_cart, clear_cart, checkout_items
+from tests_api.helpers.validation_helpers import get_admin_auth_headers, validate_mongodb_state, change_order_status, \
+    get_auth_headers, validate_checkout_response
+from utils.constants import API_LOGIN_URL, API_CART_URL, API_CHECKOUT_URL, API_ORDERS_ADMIN, API_ORDERS_STATUS_ADMIN, card_payload, \
+    API_PANEL_ADMIN, API_BULK_UPDATE_STATUS_ADMIN, API_ORDERS_URL, API_UPDATE_STATUS_ADMIN
 
 
 
@@ -84,3 +91,266 @@ def test_test_order_status(orders_collection, get_admin_token,expected_status):
     for i in range(len(data['orders'])):
         assert data['orders'][i]['status'].lower() == expected_status.lower(), f"Expected {expected_status}, but got instead {data['orders'][i]['status']}"
 
+
+
+def test_concurrent_checkouts_never_oversell(products_collection):
+    # Every buyer has its own cart with the last unit of p007 ("Disc"); they check out at the same time
+    original_stock = products_collection.find_one({"product_id": "p007"})["stock"]
+    products_collection.update_one({"product_id": "p007"}, {"$set": {"stock": 1}})
+    cart_payload = [{"product_id": "p007", "name": "Disc", "quantity": 1}]
+    buyers = []
+    for user in users_data:
+        password = base64.b64decode(user["password"]).decode()
+        token = requests.post(API_LOGIN_URL, json={"email": user["email"], "password": password}).json()["token"]
+        clear_cart(token)
+        add_items_to_cart(token, cart_payload)
+        buyers.append(get_auth_headers(token))
+
+    def checkout_disc(headers):
+        # Retry declined cards, so every buyer reaches the stock reservation
+        while True:
+            outcome, _ = validate_checkout_response(requests.post(API_CHECKOUT_URL, headers=headers,
+                                                                         json=card_payload))
+            if outcome != "card_declined":
+                return outcome
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(buyers)) as executor:
+            outcomes = list(executor.map(checkout_disc, buyers))
+        assert sorted(outcomes) == ["out_of_stock"] * (len(buyers) - 1) + ["success"], \
+            f"Expected exactly one successful checkout, got {outcomes}"
+        product = products_collection.find_one({"product_id": "p007"})
+        assert product["stock"] == 0, f"Expected stock 0, got {product['stock']}"
+    finally:
+        products_collection.update_one({"product_id": "p007"}, {"$set": {"stock": original_stock}})
+        for headers in buyers:
+            requests.delete(API_CART_URL, headers=headers)
+
+
+def test_concurrent_checkouts_get_unique_order_ids():
+    # Separate buyers check out at the same time, a few orders each
+    tokens = []
+    for user in users_data:
+        password = base64.b64decode(user["password"]).decode()
+        tokens.append(requests.post(API_LOGIN_URL, json={"email": user["email"], "password": password}).json()["token"])
+
+    def checkout_several(token):
+        return [checkout_items(token, [{"product_id": "p001", "name": "Laptop", "quantity": 1}]) for _ in range(3)]
+
+    with ThreadPoolExecutor(max_workers=len(tokens)) as executor:
+        order_ids = [order_id for ids in executor.map(checkout_several, tokens) for order_id in ids]
+    assert len(set(order_ids)) == len(order_ids), f"Duplicate order ids: {sorted(order_ids)}"
+    for order_id in order_ids:
+        assert get_order_by_id(order_id), f"Order {order_id} not found in database"
+
+
+@pytest.mark.parametrize("url", [API_ORDERS_ADMIN, f"{API_ORDERS_STATUS_ADMIN}/pending"])
+def test_admin_order_listing_pages_through_all_orders(get_admin_token, orders_collection, url):
+    headers = get_admin_auth_headers(get_admin_token)
+    # Walk the listing one order per page and compare with what the full first page returns
+    expected = requests.get(url, headers=headers, params={"limit": 1000}).json()["orders"]
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 1, **({"cursor": cursor} if cursor else {})}
+        response = requests.get(url, headers=headers, params=params)
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        page = response.json()
+        assert len(page["orders"]) <= 1
+        seen.extend(order["order_id"] for order in page["orders"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [order["order_id"] for order in expected], f"Paged listing {seen} differs from full listing"
+
+
+def test_customer_order_history_pages_from_orders_collection(get_user_token, orders_collection):
+    response_checkout, _ = add_to_cart_and_checkout(get_user_token)
+    order_id = response_checkout.json()["order_id"]
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    user_id = orders_collection.find_one({"order_id": order_id})["user_id"]
+    expected = [order["order_id"] for order in orders_collection.find({"user_id": user_id}).sort(
+        [("created_at", 1), ("order_id", 1)])]
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 1, "expand": "items", **({"cursor": cursor} if cursor else {})}
+        response = requests.get(API_ORDERS_URL, headers=headers, params=params)
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        page = response.json()
+        assert all(order["items"] for order in page["orders"]), "expand=items should include line items"
+        seen.extend(order["order_id"] for order in page["orders"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == expected, f"Paged history {seen} differs from orders in DB {expected}"
+
+    response = requests.get(f"{API_ORDERS_URL}/{order_id}", headers=headers)
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    assert "items" not in response.json()
+    response = requests.get(API_ORDERS_URL, headers=headers, params={"expand": "everything"})
+    assert response.status_code == 400, f"Expected 400, got {response.status_code}"
+
+
+def test_admin_order_listing_rejects_bad_cursor_and_dates(get_admin_token):
+    headers = get_admin_auth_headers(get_admin_token)
+    response = requests.get(API_ORDERS_ADMIN, headers=headers, params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400, f"Expected 400, got {response.status_code}"
+    response = requests.get(f"{API_ORDERS_STATUS_ADMIN}/pending", headers=headers, params={"start_date": "19-02-2025"})
+    assert response.status_code == 400, f"Expected 400, got {response.status_code}"
+    response = requests.get(f"{API_ORDERS_STATUS_ADMIN}/pending", headers=headers,
+                            params={"start_date": "2025-02-19", "end_date": "2025-02-20"})
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    for order in response.json()["orders"]:
+        assert "2025-02-19" <= order["created_at"][:10] <= "2025-02-20"
+
+
+def test_admin_order_listing_streams_json_array_and_ndjson(get_admin_token):
+    headers = get_admin_auth_headers(get_admin_token)
+    expected = [order["order_id"] for order in
+                requests.get(API_ORDERS_ADMIN, headers=headers, params={"limit": 1000}).json()["orders"]]
+    # JSON array
+    response = requests.get(API_ORDERS_ADMIN, headers=headers, params={"stream": "true", "batch_size": 2})
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    assert [order["order_id"] for order in response.json()] == expected
+    # NDJSON, chosen by the Accept header
+    response = requests.get(API_ORDERS_ADMIN, headers={**headers, "Accept": "application/x-ndjson"}, stream=True)
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    streamed = [json.loads(line)["order_id"] for line in response.iter_lines() if line]
+    assert streamed == expected
+
+
+def test_checkout_writes_confirmation_to_notification_outbox(get_user_token, test_db):
+    response_checkout, cart_payload = add_to_cart_and_checkout(get_user_token)
+    order_id = response_checkout.json()["order_id"]
+    notification = test_db["notifications_outbox"].find_one({"order_id": order_id})
+    assert notification, f"No outbox notification for order {order_id}"
+    assert "Confirmation Email" in notification["message"]
+    assert notification["status"] in ("pending", "sending", "sent"), f"Unexpected status {notification['status']}"
+
+
+def test_notification_stats_report_queue_depth(get_admin_token):
+    headers = get_admin_auth_headers(get_admin_token)
+    response = requests.get(f"{API_PANEL_ADMIN}/notifications/stats", headers=headers)
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    stats = response.json()
+    assert stats["queue_depth"] >= 0
+    assert "dispatch_latency_seconds" in stats
+
+
+def test_concurrent_status_updates_apply_exactly_once(get_user_token, get_admin_token):
+    response_checkout, cart_payload = add_to_cart_and_checkout(get_user_token)
+    order_id = response_checkout.json()["order_id"]
+    headers = get_admin_auth_headers(get_admin_token)
+    payload = {"order_id": order_id, "new_status": "Processing"}
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(
+            lambda _: requests.put(f"{API_ORDERS_ADMIN}/update-status", headers=headers, json=payload), range(4)))
+
+    status_codes = sorted(response.status_code for response in responses)
+    assert status_codes.count(200) == 1, f"Expected exactly one successful transition, got {status_codes}"
+    assert get_order_by_id(order_id)["status"] == "Processing"
+
+
+def test_bulk_status_update_reports_per_order_outcomes(get_user_token, get_admin_token):
+    order_ids = [add_to_cart_and_checkout(get_user_token)[0].json()["order_id"] for _ in range(2)]
+    headers = get_admin_auth_headers(get_admin_token)
+    payload = {"new_status": "Processing", "order_ids": order_ids + [999999]}
+
+    response = requests.put(API_BULK_UPDATE_STATUS_ADMIN, headers=headers, json=payload)
+    assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+    outcomes = {result["order_id"]: result["outcome"] for result in response.json()["results"]}
+    assert outcomes == {order_ids[0]: "updated", order_ids[1]: "updated", 999999: "not_found"}
+    for order_id in order_ids:
+        order = get_order_by_id(order_id)
+        assert order["status"] == "Processing"
+        assert "transition_id" not in order, "The transition stamp was left on the order"
+
+    # A second run finds the orders already moved
+    response = requests.put(API_BULK_UPDATE_STATUS_ADMIN, headers=headers, json=payload)
+    outcomes = {result["order_id"]: result["outcome"] for result in response.json()["results"]}
+    assert outcomes[order_ids[0]] == outcomes[order_ids[1]] == "invalid_transition"
+
+
+def test_shipping_an_order_without_stock_keeps_it_processing(get_user_token, get_admin_token, products_collection):
+    original_stock = products_collection.find_one({"product_id": "p007"})["stock"]
+    products_collection.update_one({"product_id": "p007"}, {"$set": {"stock": 1}})
+    try:
+        # Checkout takes the only Disc, so there is none left to ship
+        order_id = checkout_items(get_user_token, [{"product_id": "p007", "name": "Disc", "quantity": 1}])
+        headers = get_admin_auth_headers(get_admin_token)
+        change_order_status(headers, order_id, "Processing")
+        response = requests.put(API_UPDATE_STATUS_ADMIN, headers=headers,
+                                json={"order_id": order_id, "new_status": "Shipped"})
+        assert response.status_code == 400, f"Expected 400, got {response.status_code}"
+        data = response.json()
+        assert data["detail"] == "Not enough stock for product: Disc", f"Unexpected detail {data['detail']}"
+        assert [shortage["product_id"] for shortage in data["shortages"]] == ["p007"]
+        assert get_order_by_id(order_id)["status"] == "Processing"
+        assert products_collection.find_one({"product_id": "p007"})["stock"] == 0
+    finally:
+        products_collection.update_one({"product_id": "p007"}, {"$set": {"stock": original_stock}})
+
+
+def test_bulk_shipping_holds_back_only_orders_with_short_products(get_user_token, get_admin_token, products_collection):
+    original_stock = products_collection.find_one({"product_id": "p007"})["stock"]
+    products_collection.update_one({"product_id": "p007"}, {"$set": {"stock": 1}})
+    try:
+        # Checkout takes the only Disc, so the Disc order cannot ship; the Laptop order can
+        short_order = checkout_items(get_user_token, [{"product_id": "p007", "name": "Disc", "quantity": 1}])
+        stocked_order = checkout_items(get_user_token, [{"product_id": "p001", "name": "Laptop", "quantity": 1}])
+        headers = get_admin_auth_headers(get_admin_token)
+        for new_status in ("Processing", "Shipped"):
+            response = requests.put(API_BULK_UPDATE_STATUS_ADMIN, headers=headers,
+                                    json={"new_status": new_status, "order_ids": [short_order, stocked_order]})
+            assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        results = {result["order_id"]: result for result in response.json()["results"]}
+        assert results[stocked_order]["outcome"] == "updated", f"Unexpected result {results[stocked_order]}"
+        assert results[short_order]["outcome"] == "stock_shortage", f"Unexpected result {results[short_order]}"
+        assert [shortage["product_id"] for shortage in results[short_order]["shortages"]] == ["p007"]
+        assert get_order_by_id(stocked_order)["status"] == "Shipped"
+        assert get_order_by_id(short_order)["status"] == "Processing"
+    finally:
+        products_collection.update_one({"product_id": "p007"}, {"$set": {"stock": original_stock}})
+
+
+def test_bulk_status_update_rejects_unreachable_status(get_admin_token):
+    headers = get_admin_auth_headers(get_admin_token)
+    response = requests.put(API_BULK_UPDATE_STATUS_ADMIN, headers=headers, json={"new_status": "Pending"})
+    assert response.status_code == 400, f"Expected 400, got {response.status_code}"
+
+
+def test_admin_delete_all_orders_returns_summary(get_user_token, get_admin_token, test_db):
+    orders_collection, users_collection = test_db["orders"], test_db["users"]
+    order_id = checkout_items(get_user_token, [{"product_id": "p002", "name": "Mouse", "quantity": 1}])
+    # Deleting everything is destructive: keep the orders and order histories to put them back afterwards
+    saved_orders = list(orders_collection.find({}))
+    saved_histories = {user["user_id"]: user.get("orders", [])
+                       for user in users_collection.find({}, {"user_id": 1, "orders": 1})}
+    headers = get_admin_auth_headers(get_admin_token)
+    try:
+        response = requests.delete(API_ORDERS_ADMIN, headers=headers)
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        summary = response.json()
+        # Summary counts only, never the refund emails themselves
+        assert set(summary) == {"message", "deleted", "notifications_queued"}, f"Unexpected response {summary}"
+        assert summary["deleted"] == len(saved_orders), f"Expected {len(saved_orders)} deleted, got {summary}"
+        assert summary["notifications_queued"] == summary["deleted"], f"Expected one refund email per order: {summary}"
+        assert f"All {summary['deleted']} orders deleted" in summary["message"]
+
+        assert orders_collection.count_documents({}) == 0, "Orders left after deleting all orders"
+        assert users_collection.count_documents({"orders.0": {"$exists": True}}) == 0, "Order history left on users"
+        refund = test_db["notifications_outbox"].find_one({"order_id": order_id, "message": {"$regex": "refunded"}})
+        assert refund, f"No refund notification queued for order {order_id}"
+
+        response = requests.delete(API_ORDERS_ADMIN, headers=headers)
+        assert response.json() == {"message": "No orders found to delete", "deleted": 0, "notifications_queued": 0}
+    finally:
+        orders_collection.delete_many({})
+        if saved_orders:
+            orders_collection.insert_many(saved_orders)
+        for user_id, orders in saved_histories.items():
+            users_collection.update_one({"user_id": user_id}, {"$set": {"orders": orders}})
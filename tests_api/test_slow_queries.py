@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from observability.slow_queries import redact, query_shape, summarize_plan
+
+# explain("executionStats") of a find on orders by an unindexed field
+COLLSCAN_EXPLAIN = {
+    "queryPlanner": {
+        "namespace": "oms_db.orders",
+        "winningPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN", "filter": {"total_price": {"$gt": 100}},
+                                                        "direction": "forward"}},
+    },
+    "executionStats": {"nReturned": 3, "executionTimeMillis": 412, "totalKeysExamined": 0, "totalDocsExamined": 250000},
+}
+
+# The same query served by an index
+IXSCAN_EXPLAIN = {
+    "queryPlanner": {
+        "winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "status_created_at"}},
+    },
+    "executionStats": {"nReturned": 3, "executionTimeMillis": 1, "totalKeysExamined": 3, "totalDocsExamined": 3},
+}
+
+
+def test_redact_keeps_field_names_and_operators_only():
+    query = {"user_id": "u12345", "created_at": {"$gte": datetime(2025, 2, 19)},
+             "$or": [{"status": "Pending"}, {"status": "Processing"}], "items": []}
+    assert redact(query) == {"user_id": "?", "created_at": {"$gte": "?"}, "$or": [{"status": "?"}], "items": []}
+
+
+def test_find_shape_redacts_projection_and_sort_values():
+    command = {"find": "orders", "filter": {"user_id": "u12345"},
+               "projection": {"_id": 0, "order_id": 1, "items": {"$elemMatch": {"product_id": "p001"}}},
+               "sort": {"created_at": -1, "score": {"$meta": "textScore"}}, "limit": 5}
+    assert query_shape("find", command) == {
+        "filter": {"user_id": "?"},
+        "projection": {"_id": 0, "order_id": 1, "items": {"$elemMatch": {"product_id": "?"}}},
+        "sort": {"created_at": -1, "score": {"$meta": "?"}},
+    }
+
+
+def test_update_shape_is_the_first_statement_filter_without_the_written_documents():
+    command = {"update": "products", "updates": [
+        {"q": {"product_id": "p001", "stock": {"$gte": 2}}, "u": {"$inc": {"stock": -2}}},
+        {"q": {"product_id": "p002"}, "u": {"$inc": {"stock": -1}}},
+    ]}
+    assert query_shape("update", command) == {"q": {"product_id": "?", "stock": {"$gte": "?"}}}
+    assert query_shape("ping", {"ping": 1}) == {}
+
+
+def test_summarize_plan_flags_collection_scans():
+    summary = summarize_plan(COLLSCAN_EXPLAIN)
+    assert summary["collscan"] is True
+    assert summary["stages"] == ["SORT", "COLLSCAN"]
+    assert summary["indexes"] == []
+    assert (summary["docs_examined"], summary["returned"], summary["execution_ms"]) == (250000, 3, 412)
+
+    summary = summarize_plan(IXSCAN_EXPLAIN)
+    assert summary["collscan"] is False
+    assert summary["indexes"] == ["status_created_at"]
+
+
+def test_summarize_plan_reads_aggregation_cursor_stage():
+    explain = {"stages": [{"$cursor": COLLSCAN_EXPLAIN}, {"$group": {"_id": "$status"}}]}
+    assert summarize_plan(explain)["collscan"] is True
@@ -7,12 +7,17 @@ API_ALL_PRODUCTS = f"{API_BASE_URL}/products"
 API_CART_URL = f"{API_BASE_URL}/cart"
 API_CHECKOUT_URL = f"{API_BASE_URL}/checkout"
 API_ORDERS_URL = f"{API_BASE_URL}/orders"
+API_METRICS_URL = f"{API_BASE_URL}/metrics"
 
 ########ADMIN############
 API_PANEL_ADMIN = f"{API_BASE_URL}/panel"
 API_ORDERS_ADMIN = f"{API_BASE_URL}/panel/orders"
 API_ORDERS_STATUS_ADMIN = f"{API_BASE_URL}/panel/orders/status"
 API_UPDATE_STATUS_ADMIN = f"{API_BASE_URL}/panel/orders/update-status"
+API_BULK_UPDATE_STATUS_ADMIN = f"{API_BASE_URL}/panel/orders/bulk-update-status"
+API_STARTUP_ADMIN = f"{API_BASE_URL}/panel/startup"
+API_SLOW_QUERIES_ADMIN = f"{API_BASE_URL}/panel/diagnostics/slow-queries"
+API_PROFILES_ADMIN = f"{API_BASE_URL}/panel/profiles"
 
 
 #####Credit Card######
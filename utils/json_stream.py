@@ -0,0 +1,35 @@
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+from bson import ObjectId
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _json_default(value):
+    # Per-document conversion of the BSON types stored in OMS documents
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def document_to_json(document: dict) -> str:
+    return json.dumps(document, default=_json_default)
+
+
+async def stream_json_array(documents: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    # Emits "[doc,doc,...]" one document at a time
+    yield b"["
+    first = True
+    async for document in documents:
+        yield (("" if first else ",") + document_to_json(document)).encode("utf-8")
+        first = False
+    yield b"]"
+
+
+async def stream_ndjson(documents: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    async for document in documents:
+        yield (document_to_json(document) + "\n").encode("utf-8")
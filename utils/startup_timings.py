@@ -0,0 +1,36 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+# Cold start target; exceeding it is reported at startup, not enforced
+STARTUP_BUDGET_MS = float(os.environ.get("OMS_STARTUP_BUDGET_MS", "2000"))
+
+
+class StartupTimings:
+    """Wall-clock duration of each startup phase, in milliseconds, in the order the phases ran."""
+
+    def __init__(self, budget_ms: float = STARTUP_BUDGET_MS):
+        self.budget_ms = budget_ms
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    @property
+    def total_ms(self) -> float:
+        return round(sum(self.phases.values()), 1)
+
+    def report(self) -> dict:
+        return {"phases_ms": dict(self.phases), "total_ms": self.total_ms, "budget_ms": self.budget_ms,
+                "over_budget": self.total_ms > self.budget_ms}
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{name} {duration} ms" for name, duration in self.phases.items())
+        over = f" (over the {self.budget_ms:g} ms budget)" if self.total_ms > self.budget_ms else ""
+        return f"Startup took {self.total_ms} ms{over}: {phases}"